@@ -0,0 +1,6 @@
+#!/bin/bash
+
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+python3 src/bench.py run "$@"
@@ -0,0 +1,340 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+import click
+import yaml
+from pydantic import BaseModel
+
+from about import version
+
+UNITS: Dict[str, int] = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2,
+                         "GB": 1024 ** 3}
+SRC = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(SRC)
+
+
+class Bench:
+    class Result(BaseModel):
+        operation: str
+        requests: int
+        errors: int
+        throughput: float
+        p50: float
+        p99: float
+
+    class Scenario(BaseModel):
+        entries: int
+        size: int
+        peak_rss: int = 0
+        results: List[Bench.Result]
+
+    class Report(BaseModel):
+        version: str
+        python: str
+        scenarios: List[Bench.Scenario]
+
+    @staticmethod
+    def size(value: str) -> int:
+        match = re.fullmatch(r"\s*(\d+)\s*([KMG]?B?)\s*", value.upper())
+        if match is None:
+            raise click.BadParameter(f"size {value} not valid")
+        return int(match.group(1)) * UNITS[match.group(2)]
+
+    @staticmethod
+    def peak_rss() -> int:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @classmethod
+    def generate(cls: Type[Bench], root: str, entries: int, size: int,
+                 yaml_size: int) -> None:
+        os.makedirs(os.path.join(root, "config"))
+        os.makedirs(os.path.join(root, "data"))
+        for name in ("settings.yaml", "log.yaml"):
+            shutil.copy(os.path.join(REPO, "config", name),
+                        os.path.join(root, "config", name))
+        items = max(1, min(entries, size // 64))
+        cls.target_json(os.path.join(root, "data", "target.json"), items, size)
+        cls.target_yaml(os.path.join(root, "data", "target.yaml"), items,
+                        min(size, yaml_size))
+        formats = ("json", "yaml")
+        catalogs = {
+            "commands": {f"cmd{n}": dict(script="true", daemon=False)
+                         for n in range(entries)},
+            "configurations": {f"cfg{n}": dict(path=f"data/target.{formats[n % 2]}",
+                                               format=formats[n % 2])
+                               for n in range(entries)},
+            "parameters": {f"par{n}": dict(source=f"data/target.{formats[n % 2]}",
+                                           format=formats[n % 2],
+                                           xpath=["items", f"p{n % items}", "value"])
+                           for n in range(entries)},
+            "chains": {f"chn{n}": dict(uri="http://bench", relationship="child")
+                       for n in range(min(entries, 2))}
+        }
+        for name, catalog in catalogs.items():
+            with open(os.path.join(root, "config", f"{name}.yaml"), "w") as file:
+                yaml.dump(catalog, file, Dumper=getattr(yaml, "CSafeDumper",
+                                                        yaml.SafeDumper))
+
+    @staticmethod
+    def target_json(path: str, items: int, size: int) -> None:
+        with open(path, "w") as file:
+            file.write('{"items": ')
+            json.dump({f"p{n}": dict(value=n) for n in range(items)}, file)
+            file.write(', "padding": [')
+            padding = json.dumps("x" * 1000)
+            sep = ""
+            while file.tell() < size - 2:
+                file.write(f"{sep}{padding}")
+                sep = ", "
+            file.write("]}")
+
+    @staticmethod
+    def target_yaml(path: str, items: int, size: int) -> None:
+        with open(path, "w") as file:
+            file.write("items:\n")
+            for n in range(items):
+                file.write(f"  p{n}:\n    value: {n}\n")
+            file.write("padding:\n")
+            while file.tell() < size:
+                file.write(f"- {'x' * 1000}\n")
+
+    @staticmethod
+    def percentile(values: List[float], rank: float) -> float:
+        position = rank * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+    @classmethod
+    async def measure(cls: Type[Bench], operation: str,
+                      call: Callable[[int], Awaitable[bool]], requests: int,
+                      duration: float) -> Bench.Result:
+        latencies: List[float] = []
+        errors = 0
+        start = perf_counter()
+        while len(latencies) < requests and \
+                (not latencies or perf_counter() - start < duration):
+            begin = perf_counter()
+            if not await call(len(latencies)):
+                errors += 1
+            latencies.append(perf_counter() - begin)
+        elapsed = perf_counter() - start
+        latencies.sort()
+        res = cls.Result(operation=operation, requests=len(latencies),
+                         errors=errors, throughput=len(latencies) / elapsed,
+                         p50=cls.percentile(latencies, 0.5) * 1000,
+                         p99=cls.percentile(latencies, 0.99) * 1000)
+        click.echo(f"  {operation}: {res.throughput:.1f} req/s, "
+                   f"p50 {res.p50:.2f} ms, p99 {res.p99:.2f} ms", err=True)
+        return res
+
+    @classmethod
+    async def drive(cls: Type[Bench], requests: int,
+                    duration: float) -> List[Bench.Result]:
+        import httpx
+
+        from libs.fanout import FanOut
+        from libs.storage import Storage
+        from main import app
+        from routers.parameters import Parameters
+
+        rnd = random.Random(0)
+        results: List[Bench.Result] = []
+
+        def __sync(task: Callable[[], None]) -> Callable[[int], Awaitable[bool]]:
+            async def __call(_: int) -> bool:
+                task()
+                return True
+            return __call
+
+        snapshots = Storage.snapshots
+        Storage.snapshots = None
+        results.append(await cls.measure("Storage.load", __sync(
+            Parameters.storage.load), requests, duration))
+        Storage.snapshots = snapshots
+        Parameters.storage.load()
+        results.append(await cls.measure("Storage.load (snapshot)", __sync(
+            Parameters.storage.load), requests, duration))
+        results.append(await cls.measure("Base.init", __sync(
+            Parameters.init), requests, duration))
+
+        await app.router.startup()
+        transport = httpx.ASGITransport(app=app)
+        FanOut.transport = transport
+        try:
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url="http://bench",
+                                         timeout=None) as client:
+                for operation, method, path in cls.operations():
+                    ids = await cls.ids(client, path)
+
+                    async def __call(n: int, method: str = method,
+                                     path: str = path,
+                                     ids: List[str] = ids) -> bool:
+                        url = path.format(id=rnd.choice(ids) if ids else "",
+                                          value=n)
+                        resp = await client.request(method, url)
+                        return resp.status_code < 400
+                    results.append(await cls.measure(operation, __call,
+                                                     requests, duration))
+        finally:
+            await app.router.shutdown()
+        return results
+
+    @staticmethod
+    def operations() -> List[Tuple[str, str, str]]:
+        return [
+            ("GET /commands", "GET", "/commands?limit=100"),
+            ("GET /commands/{id}", "GET", "/commands/{id}"),
+            ("POST /commands/{id}", "POST", "/commands/{id}"),
+            ("GET /configurations", "GET", "/configurations?limit=100&fields=path"),
+            ("GET /configurations/{id}", "GET", "/configurations/{id}"),
+            ("GET /parameters", "GET", "/parameters?limit=100"),
+            ("GET /parameters (all)", "GET", "/parameters"),
+            ("GET /parameters/{id}", "GET", "/parameters/{id}"),
+            ("GET /chains", "GET", "/chains"),
+            ("GET /chains/gather/parameters/{id}", "GET",
+             "/chains/gather/parameters/{id}"),
+            ("GET /watch", "GET", "/watch?revision=0&wait=0"),
+            ("GET /metrics", "GET", "/metrics"),
+            ("POST /parameters/{id}/{value}", "POST", "/parameters/{id}/{value}"),
+        ]
+
+    @staticmethod
+    async def ids(client: Callable, path: str) -> List[str]:
+        if "{id}" not in path:
+            return []
+        resource = "parameters" if "/gather/" in path else path.split("/")[1]
+        field = dict(commands="script", configurations="path",
+                     parameters="xpath")[resource]
+        resp = await client.get(f"/{resource}?fields={field}")
+        return list(resp.json())
+
+    @classmethod
+    def run(cls: Type[Bench], entries: int, size: int, yaml_size: int,
+            requests: int, duration: float) -> Bench.Scenario:
+        root = tempfile.mkdtemp(prefix="scms-bench-")
+        try:
+            cls.generate(root, entries, size, yaml_size)
+            output = os.path.join(root, "result.json")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "scenario",
+                            "--requests", str(requests), "--duration", str(duration),
+                            "--output", output], cwd=root, check=True,
+                           stdout=subprocess.DEVNULL)
+            with open(output) as file:
+                return cls.Scenario(entries=entries, size=size, **json.load(file))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    @classmethod
+    def compare(cls: Type[Bench], report: Bench.Report, baseline: Bench.Report,
+                tolerance: float) -> List[str]:
+        base: Dict[Tuple[int, int, str], Bench.Result] = {
+            (scenario.entries, scenario.size, res.operation): res
+            for scenario in baseline.scenarios for res in scenario.results}
+        peaks: Dict[Tuple[int, int], int] = {
+            (scenario.entries, scenario.size): scenario.peak_rss
+            for scenario in baseline.scenarios}
+        regressions = []
+        for scenario in report.scenarios:
+            ref = peaks.get((scenario.entries, scenario.size))
+            if ref and scenario.peak_rss > ref * (1 + tolerance):
+                regressions.append(
+                    f"{scenario.entries} entries, {scenario.size} bytes: "
+                    f"peak_rss {ref} -> {scenario.peak_rss}")
+            for res in scenario.results:
+                old = base.get((scenario.entries, scenario.size, res.operation))
+                if old is None:
+                    continue
+                for field in ("p50", "p99"):
+                    value, ref = getattr(res, field), getattr(old, field)
+                    if ref and value > ref * (1 + tolerance):
+                        regressions.append(
+                            f"{scenario.entries} entries, {scenario.size} bytes, "
+                            f"{res.operation}: {field} {ref:.2f} -> {value:.2f}")
+        return regressions
+
+
+Bench.Scenario.update_forward_refs()
+Bench.Report.update_forward_refs()
+
+
+@click.group()
+def cli() -> None:
+    pass
+
+
+@cli.command(help="Run the benchmark for each combination of entries and size")
+@click.option("--entries", "-e", multiple=True, type=int,
+              default=[10, 1000, 100000], show_default=True,
+              help="Number of entries of each catalog")
+@click.option("--size", "-s", multiple=True, default=["1KB", "1MB", "500MB"],
+              show_default=True, help="Size of the target files")
+@click.option("--yaml-size", default="8MB", show_default=True,
+              help="Maximum size of the YAML target file")
+@click.option("--requests", "-n", default=200, show_default=True,
+              help="Maximum number of requests for each operation")
+@click.option("--duration", "-d", default=5.0, show_default=True,
+              help="Maximum duration in seconds of each operation")
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              help="File where to write the results in JSON")
+@click.option("--baseline", "-b", type=click.Path(exists=True, dir_okay=False),
+              help="Results to compare with")
+@click.option("--tolerance", "-t", default=0.2, show_default=True,
+              help="Tolerated relative increase of latencies and RSS")
+def run(entries: List[int], size: List[str], yaml_size: str, requests: int,
+        duration: float, output: Optional[str], baseline: Optional[str],
+        tolerance: float) -> None:
+    scenarios = []
+    for n in entries:
+        for bytes in map(Bench.size, size):
+            click.echo(f"Benchmark with {n} entries and targets of {bytes} bytes",
+                       err=True)
+            scenarios.append(Bench.run(n, bytes, Bench.size(yaml_size),
+                                       requests, duration))
+    report = Bench.Report(version=version, python=platform.python_version(),
+                          scenarios=scenarios)
+    if output:
+        with open(output, "w") as file:
+            file.write(report.json(indent=2))
+    else:
+        click.echo(report.json(indent=2))
+    if baseline:
+        regressions = Bench.compare(report, Bench.Report.parse_file(baseline),
+                                    tolerance)
+        for regression in regressions:
+            click.echo(f"Regression: {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+
+
+@cli.command(hidden=True)
+@click.option("--requests", type=int, required=True)
+@click.option("--duration", type=float, required=True)
+@click.option("--output", type=click.Path(dir_okay=False), required=True)
+def scenario(requests: int, duration: float, output: str) -> None:
+    sys.path.insert(0, SRC)
+    results = asyncio.run(Bench.drive(requests, duration))
+    with open(output, "w") as file:
+        json.dump(dict(peak_rss=Bench.peak_rss(),
+                       results=[res.dict() for res in results]), file)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,21 +1,71 @@
 from __future__ import annotations
 
+import json
+import os
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
 from datetime import datetime
 from enum import Enum, EnumMeta
-from typing import Callable, Dict, List, Type
+from fnmatch import fnmatchcase
+from itertools import dropwhile, islice
+from subprocess import CompletedProcess, Popen
+from typing import (Any, Awaitable, Callable, Dict, Iterable, Iterator, List,
+                    Mapping, Optional, Set, Tuple, Type)
 
-from aenum import extend_enum
-from fastapi import HTTPException
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from libs.capture import Capture
+from libs.catalog import Catalog
+from libs.conditional import Conditional
+from libs.metrics import Metrics
 from libs.reloader import Reloader
-from libs.storage import Storage
+from libs.storage import Storage, settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class Base:
     class IdMeta(EnumMeta):
         def __contains__(cls, item):
-            return item in [v.value for v in cls.__members__.values()]
+            return item in cls._value2member_map_
+
+        def extend(cls, values: Iterable[str]) -> None:
+            for value in values:
+                if value in cls._value2member_map_:
+                    continue
+                member = cls._member_type_.__new__(cls, value)
+                member._name_ = value
+                member._value_ = value
+                member.__objclass__ = cls
+                member._sort_order_ = len(cls._member_names_)
+                cls._member_names_.append(value)
+                cls._member_map_[value] = member
+                cls._value2member_map_[value] = member
+
+        def discard(cls, values: Iterable[str]) -> None:
+            removed = {value for value in values if value in cls._member_map_}
+            if not removed:
+                return
+            for value in removed:
+                del cls._member_map_[value]
+                cls._value2member_map_.pop(value, None)
+            cls._member_names_[:] = [name for name in cls._member_names_
+                                     if name not in removed]
+
+    class Listing:
+        def __init__(self: Base.Listing, cursor: Optional[str],
+                     limit: Optional[int], id: Optional[str],
+                     fields: Optional[List[str]]) -> None:
+            self.cursor = cursor
+            self.limit = limit
+            self.id = id
+            self.fields: Optional[Set[str]] = set(fields) if fields else None
 
     class ActionModel(BaseModel):
         error: bool
@@ -24,19 +74,70 @@ class Base:
         returncode: int
         start: datetime
         end: datetime
+        stdout_lines: int = 0
+        stdout_bytes: int = 0
+        stderr_lines: int = 0
+        stderr_bytes: int = 0
+        truncated: bool = False
+        output: Optional[str] = None
+
+    target: Optional[str] = None
+    targets: Dict[str, List[str]] = {}
+    fast: bool = settings.get("fast-responses", True)
+    chunk_size: int = 64 * 1024
+
+    @classmethod
+    def init(cls: Type[Base], old: Optional[Mapping] = None,
+             diff: Optional[Reloader.Diff] = None) -> None:
+        ids = cls.storage.root() or {}
+        if diff is None:
+            cls.Id.discard([id for id in cls.Id._member_map_ if id not in ids])
+            cls.Id.extend(ids.keys())
+            cls.models = {id: entry for id, entry in cls.models.items() if id in ids}
+            if cls.target is not None:
+                targets: Dict[str, List[str]] = {}
+                for id, item in ids.items():
+                    path = cls.target_path(item)
+                    if path is not None:
+                        targets.setdefault(path, []).append(id)
+                cls.targets = targets
+            return
+        stale = {*diff.removed, *diff.changed}
+        cls.Id.discard(diff.removed)
+        cls.Id.extend(diff.added)
+        revision = cls.storage.revision
+        cls.models = {id: (revision, model) for id, (model_revision, model) in cls.models.items()
+                      if model_revision == revision - 1 and id not in stale}
+        if cls.target is not None and (stale or diff.added):
+            targets = dict(cls.targets)
+            for id in stale:
+                path = cls.target_path(old.get(id))
+                if path is not None:
+                    targets[path] = [other for other in targets.get(path, []) if other != id]
+                    if not targets[path]:
+                        del targets[path]
+            for id in [*diff.added, *diff.changed]:
+                path = cls.target_path(ids[id])
+                if path is not None:
+                    targets[path] = [*targets.get(path, []), id]
+            cls.targets = targets
+
+    @classmethod
+    def target_path(cls: Type[Base], item: Any) -> Optional[str]:
+        if isinstance(item, dict) and item.get(cls.target):
+            return os.path.abspath(item[cls.target])
+        return None
 
     @classmethod
-    def init(cls: Type[Base]) -> None:
-        for id in cls.Id:
-            if id not in cls.storage.root().keys():
-                cls.Id.__dict__['_member_names_'].remove(id.name)
-        for id in cls.storage.root().keys():
-            if id not in cls.Id:
-                extend_enum(cls.Id, id, id)
+    def paths(cls: Type[Base], id: Base.Id) -> List[str]:
+        path = cls.target_path((cls.storage.root() or {}).get(id.name))
+        return [cls.storage_path] if path is None else [cls.storage_path, path]
 
     @classmethod
     def setup(cls: Type[Base]) -> None:
-        cls.storage = Storage(cls.storage_path)
+        cls.storage = Storage(cls.storage_path,
+                              Catalog.items if Catalog.shared else None)
+        cls.models: Dict[str, Tuple[int, BaseModel]] = {}
         cls.InputModel.update_forward_refs()
         cls.OutputModel.update_forward_refs()
         Reloader.add_router_klass(cls.storage_path, cls)
@@ -46,15 +147,138 @@ class Base:
         if id not in cls.storage.root():
             raise HTTPException(status_code=404,
                                 detail=f"{cls.label.title()} {id} not found")
-        return cls.storage.get_model(cls.InputModel, id.name)
+        revision = cls.storage.revision
+        entry = cls.models.get(id.name)
+        if entry is not None and entry[0] == revision:
+            return entry[1]
+        model = cls.storage.get_model(cls.InputModel, id.name)
+        cls.models[id.name] = revision, model
+        return model
+
+    @staticmethod
+    def dumps(data: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, default=jsonable_encoder,
+                                    option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass
+        return json.dumps(jsonable_encoder(data)).encode()
+
+    @classmethod
+    def respond(cls: Type[Base], model: BaseModel | Response,
+                response: Optional[Response] = None) -> BaseModel | Response:
+        if not cls.fast or not isinstance(model, BaseModel):
+            return model
+        headers = None
+        if response is not None:
+            headers = {key: value for key, value in response.headers.items()
+                       if key != "content-length"}
+        return Response(cls.dumps(model.dict()), media_type="application/json",
+                        headers=headers)
 
     @staticmethod
-    def process(data: str) -> List[str]:
-        try:
-            __process = map(lambda item: item.strip(), data.split("\n"))
-            return list(filter(lambda item: item, __process))
-        except Exception:
-            return []
+    def list_query(
+        cursor: Optional[str] = Query(None, description="Cursor returned "
+                                      "in the X-Next-Cursor header"),
+        limit: Optional[int] = Query(None, gt=0, description="Maximum "
+                                     "number of items to return"),
+        id: Optional[str] = Query(None, description="Glob pattern "
+                                  "of the ids to return"),
+        fields: Optional[List[str]] = Query(None, description="Fields "
+                                            "to return")
+    ) -> Base.Listing:
+        return Base.Listing(cursor, limit, id, fields)
+
+    @classmethod
+    def select(cls: Type[Base],
+               listing: Base.Listing) -> Tuple[List[Base.Id], Optional[str]]:
+        ids: Iterator[Base.Id] = iter(cls.Id)
+        if listing.cursor:
+            try:
+                padding = "=" * (-len(listing.cursor) % 4)
+                last = urlsafe_b64decode(f"{listing.cursor}{padding}").decode()
+            except (DecodeError, UnicodeDecodeError):
+                last = None
+            if last not in cls.Id:
+                raise HTTPException(status_code=400,
+                                    detail=f"Cursor {listing.cursor} not valid")
+            ids = dropwhile(lambda id: id != last, ids)
+            next(ids)
+        if listing.id:
+            ids = filter(lambda id: fnmatchcase(id.value, listing.id), ids)
+        if listing.fields:
+            unknown = listing.fields - cls.OutputModel.__fields__.keys()
+            if unknown:
+                raise HTTPException(status_code=400,
+                                    detail=f"Fields {sorted(unknown)} not valid")
+        if listing.limit is None:
+            return list(ids), None
+        selected = list(islice(ids, listing.limit + 1))
+        if len(selected) <= listing.limit:
+            return selected, None
+        last = selected[listing.limit - 1].value
+        return selected[:listing.limit], \
+            urlsafe_b64encode(last.encode()).decode().rstrip("=")
+
+    @classmethod
+    def stream_list(
+        cls: Type[Base], listing: Base.Listing,
+        record: Callable[[Base.Id], BaseModel | Iterable[bytes]],
+        request: Optional[Request] = None,
+        paths: Optional[Callable[[Base.Id], Iterable[str]]] = None,
+        prepare: Optional[Callable[[List[Base.Id]], None]] = None
+    ) -> Response:
+        ids, next_cursor = cls.select(listing)
+        sources = [cls.storage_path]
+        if paths is not None:
+            for id in ids:
+                sources.extend(paths(id))
+        headers = Conditional.validators(sources)
+        not_modified = Conditional.not_modified(request, headers)
+        if not_modified is not None:
+            return not_modified
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if prepare is not None:
+            prepare(ids)
+
+        def __items() -> Iterator[bytes]:
+            buffer = bytearray(b"{")
+            for n, id in enumerate(ids):
+                try:
+                    item = record(id)
+                    if isinstance(item, BaseModel):
+                        item = cls.dumps(item.dict(include=listing.fields))
+                except HTTPException as http_err:
+                    item = cls.dumps(dict(detail=http_err.detail))
+                if n:
+                    buffer += b","
+                buffer += cls.dumps(id.value)
+                buffer += b":"
+                if isinstance(item, bytes):
+                    buffer += item
+                else:
+                    yield bytes(buffer)
+                    buffer.clear()
+                    yield from item
+                if len(buffer) >= cls.chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+            buffer += b"}"
+            yield bytes(buffer)
+        return StreamingResponse(__items(), media_type="application/json",
+                                 headers=headers)
+
+    @staticmethod
+    def event(event: str, data: str, id: Optional[int] = None) -> str:
+        lines = "".join(f"data: {line}\n" for line in data.split("\r"))
+        header = f"id: {id}\n" if id is not None else ""
+        return f"{header}event: {event}\n{lines}\n"
+
+    @staticmethod
+    def process(data: str | Capture) -> Capture:
+        return data if isinstance(data, Capture) else Capture.text(data)
 
     @classmethod
     def action(
@@ -64,13 +288,43 @@ class Base:
         start = datetime.now()
         res = task(cls.get(id), **task_kwargs)
         end = datetime.now()
+        Metrics.action(cls.label, id.value, "action", res.returncode,
+                       (end - start).total_seconds())
+        return cls.result(res, start, end)
+
+    @classmethod
+    async def async_action(
+        cls: Type[Base], id: Base.Id, task: Callable[..., Awaitable],
+        **task_kwargs: Dict[any, any]
+    ) -> Base.ActionModel:
+        item = cls.get(id)
+        start = datetime.now()
+        res = await task(item, **task_kwargs)
+        end = datetime.now()
+        Metrics.action(cls.label, id.value, "action", res.returncode,
+                       (end - start).total_seconds())
+        return cls.result(res, start, end)
+
+    @classmethod
+    def result(
+        cls: Type[Base], res: CompletedProcess[str | Capture] | Popen,
+        start: datetime, end: datetime
+    ) -> Base.ActionModel:
+        stdout, stderr = cls.process(res.stdout), cls.process(res.stderr)
         return cls.ActionModel(
             error=res.returncode is not None and res.returncode > 0,
-            stdout=cls.process(res.stdout),
-            stderr=cls.process(res.stderr),
+            stdout=stdout.output(),
+            stderr=stderr.output(),
             returncode=res.returncode or 0,
             start=start,
             end=end,
+            stdout_lines=stdout.lines,
+            stdout_bytes=stdout.bytes,
+            stderr_lines=stderr.lines,
+            stderr_bytes=stderr.bytes,
+            truncated=any([stdout.truncated, stdout.clipped,
+                           stderr.truncated, stderr.clipped]),
+            output=stdout.id
         )
 
 
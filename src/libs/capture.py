@@ -0,0 +1,161 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import logging
+import os
+from asyncio import StreamReader
+from collections import deque
+from enum import Enum
+from typing import AsyncIterator, BinaryIO, Deque, Iterator, List, Optional, Tuple, Type
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from libs.files import Files
+from libs.scanner import Scanner
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class Channel(str, Enum):
+    stdout = "stdout"
+    stderr = "stderr"
+
+
+class Capture:
+    head_size: int = settings.get("commands-output-head", 100)
+    tail_size: int = settings.get("commands-output-tail", 1000)
+    spill: bool = settings.get("commands-output-spill", False)
+    path: str = settings.get("commands-output-dir", ".cache/outputs")
+    keep: int = settings.get("commands-output-keep", 100)
+    line_limit: int = 64 * 1024
+    chunk_size: int = 64 * 1024
+
+    def __init__(self: Capture, id: Optional[str] = None,
+                 file: Optional[BinaryIO] = None,
+                 line_limit: Optional[int] = None) -> None:
+        self.id = id
+        self.file = file
+        if line_limit is not None:
+            self.line_limit = line_limit
+        self.head: List[str] = []
+        self.tail: Deque[str] = deque(maxlen=self.tail_size)
+        self.partial = bytearray()
+        self.lines = 0
+        self.kept = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.clipped = 0
+
+    @classmethod
+    def text(cls: Type[Capture], data: Optional[str]) -> Capture:
+        capture = cls()
+        capture.feed((data or "").encode())
+        capture.close()
+        return capture
+
+    @classmethod
+    def pair(cls: Type[Capture]) -> Tuple[Capture, Capture]:
+        if not cls.spill:
+            return cls(), cls()
+        os.makedirs(cls.path, exist_ok=True)
+        Files.rotate(cls.path, cls.keep - 1)
+        id = uuid4().hex
+        return tuple(cls(id, open(cls.file_path(id, channel), "wb"))
+                     for channel in Channel)
+
+    @classmethod
+    def file_path(cls: Type[Capture], id: str, channel: Channel) -> str:
+        return os.path.join(cls.path, f"{id}.{channel.value}")
+
+    @classmethod
+    def read(cls: Type[Capture], id: str, channel: Channel) -> Iterator[bytes]:
+        try:
+            file = open(cls.file_path(id, channel), "rb")
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Output {id} not found")
+        return Scanner.read(file)
+
+    async def drain(self: Capture, reader: StreamReader) -> None:
+        try:
+            async for line in self.iterate(reader):
+                self.line(line)
+        finally:
+            self.close()
+
+    async def iterate(self: Capture, reader: StreamReader) -> AsyncIterator[str]:
+        while True:
+            chunk = await reader.read(self.chunk_size)
+            if not chunk:
+                break
+            for line in self.split(chunk):
+                yield line
+        for line in self.rest():
+            yield line
+
+    def feed(self: Capture, chunk: bytes) -> None:
+        for line in self.split(chunk):
+            self.line(line)
+
+    def split(self: Capture, chunk: bytes) -> Iterator[str]:
+        self.bytes += len(chunk)
+        if self.file is not None:
+            self.file.write(chunk)
+        start = 0
+        end = chunk.find(b"\n")
+        while end >= 0:
+            self.append(chunk[start:end])
+            yield self.cut()
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        self.append(chunk[start:])
+
+    def rest(self: Capture) -> Iterator[str]:
+        if self.partial or self.dropped:
+            yield self.cut()
+
+    def append(self: Capture, data: bytes) -> None:
+        room = self.line_limit - len(self.partial)
+        if len(data) > room:
+            self.dropped += len(data) - max(room, 0)
+            data = data[:max(room, 0)]
+        self.partial += data
+
+    def cut(self: Capture) -> str:
+        line = self.partial.decode(errors="replace").rstrip("\r")
+        if self.dropped:
+            line = f"{line} [{self.dropped} bytes truncated]"
+            self.clipped += 1
+            self.dropped = 0
+        self.partial.clear()
+        return line
+
+    def line(self: Capture, line: str) -> None:
+        self.lines += 1
+        line = line.strip()
+        if not line:
+            return
+        self.kept += 1
+        if len(self.head) < self.head_size:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+
+    def close(self: Capture) -> None:
+        for line in self.rest():
+            self.line(line)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @property
+    def truncated(self: Capture) -> int:
+        return self.kept - len(self.head) - len(self.tail)
+
+    def output(self: Capture) -> List[str]:
+        if not self.truncated:
+            return [*self.head, *self.tail]
+        return [*self.head, f"[{self.truncated} lines truncated]", *self.tail]
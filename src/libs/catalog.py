@@ -0,0 +1,236 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+from collections.abc import Mapping
+from functools import partial
+from threading import Event, RLock, Thread
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from watchdog.events import (FileSystemEvent, FileSystemMovedEvent,
+                             PatternMatchingEventHandler)
+
+from libs.files import Files
+from libs.metrics import Metrics
+from libs.reloader import Reloader
+from libs.storage import Storage, settings
+
+log = logging.getLogger(__name__)
+
+CATALOG_DIR = "SCMS_CATALOG_DIR"
+HEADER = struct.Struct("<Q")
+
+
+class Catalog:
+    class Items(Mapping):
+        def __init__(self: Catalog.Items, path: str) -> None:
+            with open(path, "rb") as file:
+                self.buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            size, = HEADER.unpack_from(self.buf, 0)
+            self.start = HEADER.size + size
+            self.index: Dict[str, Tuple[int, int]] = pickle.loads(
+                self.buf[HEADER.size:self.start])
+
+        def __getitem__(self: Catalog.Items, key: str) -> Any:
+            offset, size = self.index[key]
+            offset += self.start
+            return pickle.loads(self.buf[offset:offset + size])
+
+        def raw(self: Catalog.Items, key: str) -> bytes:
+            offset, size = self.index[key]
+            offset += self.start
+            return self.buf[offset:offset + size]
+
+        def __contains__(self: Catalog.Items, key: object) -> bool:
+            return key in self.index
+
+        def __iter__(self: Catalog.Items) -> Iterator[str]:
+            return iter(self.index)
+
+        def __len__(self: Catalog.Items) -> int:
+            return len(self.index)
+
+    path: str = os.environ.get(CATALOG_DIR) or settings.get("catalog-dir", ".cache/catalog")
+    poll_interval: float = settings.get("catalog-poll-interval", 0.5)
+    shared: bool = CATALOG_DIR in os.environ
+    revision: int = 0
+    manifest: Dict[str, str] = {}
+    written: Dict[str, Tuple[int, str]] = {}
+    header: Optional[mmap.mmap] = None
+    lock: RLock = RLock()
+    stopping: Event = Event()
+    poller: Optional[Thread] = None
+
+    @classmethod
+    def prepare(cls: Type[Catalog]) -> None:
+        cls.path = os.environ.setdefault(CATALOG_DIR, os.path.abspath(cls.path))
+        os.makedirs(cls.path, exist_ok=True)
+        with open(cls.file("revision"), "wb") as file:
+            file.write(HEADER.pack(0))
+        cls.publish()
+        Reloader.start("config", catalogs=False)
+        handler = PatternMatchingEventHandler(patterns=Reloader.router_klasses.keys())
+        handler.on_modified = cls.on_modified
+        handler.on_created = cls.on_modified
+        handler.on_moved = cls.on_moved
+        Reloader.observer.schedule(handler, "config", recursive=False)
+        log.info(f"Catalogs shared with the workers in {cls.path}")
+
+    @classmethod
+    def close(cls: Type[Catalog]) -> None:
+        Reloader.stop()
+
+    @classmethod
+    def on_modified(cls: Type[Catalog], event: FileSystemEvent) -> None:
+        cls.on_change(event.src_path)
+
+    @classmethod
+    def on_moved(cls: Type[Catalog], event: FileSystemMovedEvent) -> None:
+        cls.on_change(event.dest_path)
+
+    @classmethod
+    def on_change(cls: Type[Catalog], path: str) -> None:
+        key: str = path.replace(f'{os.getcwd()}/', '')
+        router_klass = Reloader.router_klasses.get(key)
+        if router_klass is not None:
+            Metrics.reload_events.labels(router_klass.label).inc()
+            Reloader.debounce(key, partial(cls.refresh, router_klass))
+
+    @classmethod
+    def refresh(cls: Type[Catalog], router_klass: any) -> None:
+        if Reloader.reload(router_klass) is not None:
+            cls.publish()
+
+    @classmethod
+    def file(cls: Type[Catalog], name: str) -> str:
+        return os.path.join(cls.path, name)
+
+    @classmethod
+    def publish(cls: Type[Catalog]) -> None:
+        with cls.lock:
+            manifest = {path: cls.write(klass.storage)
+                        for path, klass in Reloader.router_klasses.items()}
+            cls.revision += 1
+            cls.replace(f"manifest.{cls.revision}", pickle.dumps(manifest))
+            with open(cls.file("revision"), "r+b") as file:
+                file.write(HEADER.pack(cls.revision))
+            cls.manifest = manifest
+            cls.clean()
+        log.info(f"Catalogs revision {cls.revision} published")
+
+    @classmethod
+    def write(cls: Type[Catalog], storage: Storage) -> str:
+        revision, name = cls.written.get(storage.path, (None, None))
+        if revision == storage.revision and os.path.exists(cls.file(name)):
+            return name
+        items: List[bytes] = []
+        index: Dict[str, Tuple[int, int]] = {}
+        offset = 0
+        for key, value in (storage.root() or {}).items():
+            item = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            index[key] = offset, len(item)
+            items.append(item)
+            offset += len(item)
+        head = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+        data = b"".join([HEADER.pack(len(head)), head, *items])
+        name = os.path.normpath(storage.path).replace(os.sep, "_")
+        name = f"{name}.{hashlib.sha256(data).hexdigest()}.catalog"
+        if not os.path.exists(cls.file(name)):
+            cls.replace(name, data)
+        cls.written[storage.path] = storage.revision, name
+        return name
+
+    @classmethod
+    def replace(cls: Type[Catalog], name: str, data: bytes) -> None:
+        with Files.atomic(cls.file(name)) as file:
+            file.write(data)
+
+    @classmethod
+    def clean(cls: Type[Catalog]) -> None:
+        keep = {f"manifest.{cls.revision}", f"manifest.{cls.revision - 1}",
+                "revision", "events", *cls.manifest.values()}
+        previous = cls.file(f"manifest.{cls.revision - 1}")
+        if os.path.exists(previous):
+            with open(previous, "rb") as file:
+                keep.update(pickle.load(file).values())
+        for name in os.listdir(cls.path):
+            if name not in keep and not name.startswith("tmp"):
+                os.remove(cls.file(name))
+
+    @classmethod
+    def current(cls: Type[Catalog]) -> int:
+        if cls.header is None:
+            with open(cls.file("revision"), "rb") as file:
+                cls.header = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return HEADER.unpack_from(cls.header, 0)[0]
+
+    @classmethod
+    def items(cls: Type[Catalog], path: str) -> Optional[Catalog.Items]:
+        with cls.lock:
+            if not cls.manifest:
+                cls.revision = cls.current()
+                cls.load(cls.revision)
+            name = cls.manifest.get(path)
+        return None if name is None else cls.Items(cls.file(name))
+
+    @classmethod
+    def load(cls: Type[Catalog], revision: int) -> Dict[str, str]:
+        with open(cls.file(f"manifest.{revision}"), "rb") as file:
+            manifest = pickle.load(file)
+        old, cls.manifest = cls.manifest, manifest
+        return old
+
+    @classmethod
+    def sync(cls: Type[Catalog]) -> None:
+        if cls.current() == cls.revision:
+            return
+        with cls.lock:
+            revision = cls.current()
+            if revision == cls.revision:
+                return
+            old = cls.load(revision)
+            for path, name in cls.manifest.items():
+                router_klass = Reloader.router_klasses.get(path)
+                if router_klass is not None and old.get(path) != name:
+                    log.info(f"Catalog {path} changed in revision {revision}")
+                    Reloader.reload(router_klass)
+            cls.revision = revision
+
+    @classmethod
+    def start(cls: Type[Catalog]) -> None:
+        cls.stopping.clear()
+        cls.poller = Thread(target=cls.run, name="catalog-poller", daemon=True)
+        cls.poller.start()
+
+    @classmethod
+    def stop(cls: Type[Catalog]) -> None:
+        cls.stopping.set()
+        if cls.poller is not None:
+            cls.poller.join()
+            cls.poller = None
+
+    @classmethod
+    def run(cls: Type[Catalog]) -> None:
+        while not cls.stopping.wait(cls.poll_interval):
+            try:
+                cls.sync()
+            except Exception as err:
+                log.exception(f"Sync of the catalogs failed: {err}")
+
+    class Middleware:
+        def __init__(self: Catalog.Middleware, app: Callable) -> None:
+            self.app = app
+
+        async def __call__(self: Catalog.Middleware, scope: Dict,
+                           receive: Callable[[], Awaitable[Dict]],
+                           send: Callable[[Dict], Awaitable[None]]) -> None:
+            if scope["type"] == "http":
+                Catalog.sync()
+            await self.app(scope, receive, send)
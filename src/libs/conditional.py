@@ -0,0 +1,79 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from fastapi import Request, Response
+
+
+class Conditional:
+    pending: Dict[str, Tuple[int, int, int]] = {}
+
+    @staticmethod
+    def identity(path: str) -> Tuple[int, int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @classmethod
+    def validators(cls: Type[Conditional],
+                   paths: Iterable[str]) -> Dict[str, str]:
+        identities: List[Tuple[int, int, int]] = []
+        for path in dict.fromkeys(paths):
+            identity = cls.pending.get(os.path.abspath(path)) if cls.pending else None
+            if identity is not None:
+                identities.append(identity)
+                continue
+            try:
+                identities.append(cls.identity(path))
+            except FileNotFoundError:
+                identities.append((0, 0, 0))
+        digest = hashlib.sha1(repr(identities).encode()).hexdigest()
+        mtime = max(identity[0] for identity in identities) // 10 ** 9
+        return {"ETag": f'"{digest}"',
+                "Last-Modified": formatdate(mtime, usegmt=True)}
+
+    @classmethod
+    def etag(cls: Type[Conditional], paths: Iterable[str]) -> str:
+        return cls.validators(paths)["ETag"]
+
+    @staticmethod
+    def match(etag: str, header: str) -> bool:
+        tags = [tag.strip() for tag in header.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    @classmethod
+    def not_modified(cls: Type[Conditional], request: Optional[Request],
+                     headers: Dict[str, str]) -> Optional[Response]:
+        if request is None:
+            return None
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            not_modified = cls.match(headers["ETag"], if_none_match)
+        elif if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                modified = parsedate_to_datetime(headers["Last-Modified"])
+                not_modified = modified <= since
+            except (TypeError, ValueError):
+                not_modified = False
+        else:
+            not_modified = False
+        return Response(status_code=304, headers=headers) if not_modified else None
+
+    @classmethod
+    def check(cls: Type[Conditional], request: Optional[Request],
+              response: Optional[Response],
+              paths: Iterable[str]) -> Optional[Response]:
+        if request is None:
+            return None
+        headers = cls.validators(paths)
+        not_modified = cls.not_modified(request, headers)
+        if not_modified is None and response is not None:
+            response.headers.update(headers)
+        return not_modified
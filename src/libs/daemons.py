@@ -0,0 +1,255 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import os
+import signal
+from asyncio.subprocess import Process
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+from time import monotonic
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from libs.capture import Capture, Channel
+from libs.files import Files
+from libs.metrics import Metrics
+from libs.scanner import Scanner
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class Daemons:
+    class Daemon:
+        def __init__(self: Daemons.Daemon, script: str, proc: Process) -> None:
+            self.script = script
+            self.proc = proc
+            self.start = datetime.now()
+            self.end: Optional[datetime] = None
+            self.task: Optional[asyncio.Future] = None
+
+    class StateModel(BaseModel):
+        script: str
+        pid: int
+        start: datetime
+        end: Optional[datetime]
+        returncode: Optional[int]
+
+    class StatusModel(BaseModel):
+        script: str
+        pid: int
+        running: bool
+        returncode: Optional[int]
+        start: datetime
+        end: Optional[datetime]
+        cpu: Optional[float]
+        rss: Optional[int]
+
+    class TailModel(BaseModel):
+        stdout: List[str]
+        stderr: List[str]
+
+    registry: Dict[str, Daemons.Daemon] = {}
+    tail: int = settings.get("daemons-tail", 1000)
+    stop_timeout: float = settings.get("daemons-stop-timeout", 10)
+    path: str = settings.get("daemons-dir", ".cache/daemons")
+    compact_size: int = 1024 * 1024
+    compact_interval: float = 1.0
+    poll_interval: float = 0.1
+    clock_ticks: int = os.sysconf("SC_CLK_TCK")
+    page_size: int = os.sysconf("SC_PAGE_SIZE")
+
+    @classmethod
+    async def start(cls: Type[Daemons], id: str, script: str) -> Daemons.Daemon:
+        os.makedirs(cls.path, exist_ok=True)
+        async with cls.locked(id):
+            state = cls.load(id)
+            if state is not None and cls.running(state):
+                raise HTTPException(status_code=409,
+                                    detail=f"Daemon {id} already running "
+                                    f"with pid {state.pid}")
+            stdout, stderr = (open(cls.file(id, channel.value), "ab") for channel in Channel)
+            try:
+                stdout.truncate(0)
+                stderr.truncate(0)
+                proc = await asyncio.create_subprocess_shell(script, stdout=stdout,
+                                                             stderr=stderr,
+                                                             start_new_session=True)
+            finally:
+                stdout.close()
+                stderr.close()
+            daemon = cls.Daemon(script, proc)
+            cls.save(id, daemon)
+        daemon.task = asyncio.ensure_future(cls._reap(id, daemon))
+        cls.registry[id] = daemon
+        log.info(f"Daemon {id} started with pid {proc.pid}")
+        return daemon
+
+    @classmethod
+    @asynccontextmanager
+    async def locked(cls: Type[Daemons], id: str) -> AsyncIterator[None]:
+        with open(cls.file(id, "lock"), "a") as file:
+            while True:
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(cls.poll_interval / 10)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    @classmethod
+    def file(cls: Type[Daemons], id: str, kind: str) -> str:
+        return os.path.join(cls.path, f"{id}.{kind}")
+
+    @classmethod
+    def save(cls: Type[Daemons], id: str, daemon: Daemons.Daemon) -> None:
+        state = cls.StateModel(script=daemon.script, pid=daemon.proc.pid,
+                               start=daemon.start, end=daemon.end,
+                               returncode=daemon.proc.returncode)
+        with Files.atomic(cls.file(id, "json"), "w") as file:
+            file.write(state.json())
+
+    @classmethod
+    def load(cls: Type[Daemons], id: str) -> Optional[Daemons.StateModel]:
+        try:
+            return cls.StateModel.parse_file(cls.file(id, "json"))
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def get(cls: Type[Daemons], id: str) -> Daemons.StateModel:
+        state = cls.load(id)
+        if state is None:
+            raise HTTPException(status_code=404,
+                                detail=f"Daemon {id} not found")
+        return state
+
+    @staticmethod
+    def alive(pgid: int) -> bool:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @classmethod
+    def running(cls: Type[Daemons], state: Daemons.StateModel) -> bool:
+        return state.end is None and cls.alive(state.pid)
+
+    @classmethod
+    async def stop(cls: Type[Daemons], id: str) -> Daemons.StateModel:
+        state = cls.get(id)
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if not cls.running(state):
+                break
+            with suppress(ProcessLookupError):
+                os.killpg(state.pid, sig)
+            deadline = monotonic() + cls.stop_timeout
+            while cls.running(state) and monotonic() < deadline:
+                await asyncio.sleep(cls.poll_interval)
+                state = cls.get(id)
+        return state
+
+    @classmethod
+    def status(cls: Type[Daemons], id: str) -> Daemons.StatusModel:
+        state = cls.get(id)
+        running = cls.running(state)
+        cpu, rss = cls.usage(state.pid) if running else (None, None)
+        return cls.StatusModel(script=state.script, pid=state.pid,
+                               running=running, returncode=state.returncode,
+                               start=state.start, end=state.end,
+                               cpu=cpu, rss=rss)
+
+    @classmethod
+    def output(cls: Type[Daemons], id: str,
+               lines: Optional[int] = None) -> Daemons.TailModel:
+        cls.get(id)
+        cls.compact(id)
+        count = min(lines or cls.tail, cls.tail)
+        return cls.TailModel(stdout=cls.lines(id, Channel.stdout, count),
+                             stderr=cls.lines(id, Channel.stderr, count))
+
+    @classmethod
+    def lines(cls: Type[Daemons], id: str, channel: Channel,
+              count: int) -> List[str]:
+        try:
+            file = open(cls.file(id, channel.value), "rb")
+        except FileNotFoundError:
+            return []
+        capture = Capture()
+        lines: Deque[str] = deque(maxlen=count)
+        for chunk in Scanner.read(file):
+            lines.extend(capture.split(chunk))
+        lines.extend(capture.rest())
+        return list(lines)
+
+    @classmethod
+    def compact(cls: Type[Daemons], id: str) -> None:
+        for channel in Channel:
+            try:
+                file = open(cls.file(id, channel.value), "r+b")
+            except FileNotFoundError:
+                continue
+            with file:
+                if os.fstat(file.fileno()).st_size <= cls.compact_size:
+                    continue
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                content = file.read()
+                end = content.rfind(b"\n") + 1
+                lines = deque(Capture().split(content[:end]), maxlen=cls.tail)
+                data = "".join(f"{line}\n" for line in lines).encode() + content[end:]
+                data += file.read()
+                file.seek(0)
+                file.write(data)
+                file.truncate()
+
+    @classmethod
+    def usage(cls: Type[Daemons],
+              pgid: int) -> Tuple[Optional[float], Optional[int]]:
+        cpu, rss, found = 0, 0, False
+        if not os.path.isdir("/proc"):
+            return None, None
+        for pid in filter(str.isdigit, os.listdir("/proc")):
+            try:
+                with open(f"/proc/{pid}/stat", "r") as file:
+                    fields = file.read().rsplit(")", 1)[1].split()
+            except (OSError, IndexError):
+                continue
+            if int(fields[2]) == pgid:
+                found = True
+                cpu += int(fields[11]) + int(fields[12])
+                rss += int(fields[21])
+        if not found:
+            return None, None
+        return cpu / cls.clock_ticks, rss * cls.page_size
+
+    @classmethod
+    async def _reap(cls: Type[Daemons], id: str, daemon: Daemons.Daemon) -> None:
+        waiter = asyncio.ensure_future(daemon.proc.wait())
+        while not (await asyncio.wait([waiter], timeout=cls.compact_interval))[0]:
+            cls.compact(id)
+        returncode = waiter.result()
+        daemon.end = datetime.now()
+        cls.save(id, daemon)
+        if cls.registry.get(id) is daemon:
+            del cls.registry[id]
+        Metrics.action("command", id, "daemon", returncode,
+                       (daemon.end - daemon.start).total_seconds())
+        log.warning(f"Daemon {id} with pid {daemon.proc.pid} "
+                    f"exited with {returncode}")
@@ -0,0 +1,228 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections import OrderedDict
+from copy import deepcopy
+from functools import partial
+from threading import Event, Lock, RLock, Thread
+from time import perf_counter, time_ns
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, Type
+
+import yaml
+
+from libs.base import Format
+from libs.conditional import Conditional
+from libs.files import Files
+from libs.metrics import Metrics
+from libs.reloader import Reloader
+from libs.storage import Loader, settings
+
+log = logging.getLogger(__name__)
+
+
+class Documents:
+    class Entry(NamedTuple):
+        identity: Tuple[int, int, int]
+        content: any
+        size: int
+
+    class Pending:
+        def __init__(self: Documents.Pending, content: any) -> None:
+            self.content = content
+            self.updates = 0
+
+    loader: Dict[Format, Callable] = {Format.yaml:
+                                      partial(yaml.load, Loader=Loader),
+                                      Format.json: json.load}
+    dumper: Dict[Format, Callable] = {Format.yaml: yaml.dump,
+                                      Format.json: json.dump}
+
+    entries: OrderedDict[Tuple[str, Format], Documents.Entry] = OrderedDict()
+    budget: int = settings.get("documents-cache-size", 64 * 1024 * 1024)
+    size: int = 0
+    stats: Dict[str, int] = dict(hits=0, misses=0, evictions=0)
+    lock: RLock = RLock()
+    guards: Dict[str, Lock] = {}
+
+    write_behind: bool = settings.get("documents-write-behind", False)
+    flush_interval: float = settings.get("documents-flush-interval", 1)
+    flush_size: int = settings.get("documents-flush-size", 1000)
+    pending: Dict[Tuple[str, Format], Documents.Pending] = {}
+    flusher: Optional[Thread] = None
+    stream_size: int = settings.get("documents-stream-size", 32 * 1024 * 1024)
+    stopping: Event = Event()
+
+    @classmethod
+    def guard(cls: Type[Documents], path: str) -> Lock:
+        path = os.path.abspath(path)
+        with cls.lock:
+            return cls.guards.setdefault(path, Lock())
+
+    @classmethod
+    def load(cls: Type[Documents], path: str, format: Format) -> any:
+        path = os.path.abspath(path)
+        key = (path, format)
+        with cls.lock:
+            pending = cls.pending.get(key)
+            if pending is not None:
+                cls.stats["hits"] += 1
+                Metrics.cache.labels("hit").inc()
+                return pending.content
+        identity = Conditional.identity(path)
+        with cls.lock:
+            entry = cls.entries.get(key)
+            if entry is not None and entry.identity == identity:
+                cls.entries.move_to_end(key)
+                cls.stats["hits"] += 1
+                Metrics.cache.labels("hit").inc()
+                return entry.content
+            cls.stats["misses"] += 1
+            Metrics.cache.labels("miss").inc()
+        content = cls.read(path, format)
+        cls.store(key, cls.Entry(identity, content, identity[1]))
+        Reloader.watch(path, cls.invalidate)
+        return content
+
+    @classmethod
+    def streamable(cls: Type[Documents], path: str, format: Format) -> bool:
+        if format != Format.json or not cls.stream_size:
+            return False
+        path = os.path.abspath(path)
+        with cls.lock:
+            if (path, format) in cls.pending:
+                return False
+        return os.stat(path).st_size >= cls.stream_size
+
+    @classmethod
+    def read(cls: Type[Documents], path: str, format: Format) -> any:
+        with open(path, "r") as file, Metrics.parse.labels(format.value).time():
+            return cls.loader[format](file)
+
+    @classmethod
+    def dump(cls: Type[Documents], path: str, format: Format,
+             content: any) -> None:
+        path = os.path.abspath(path)
+        try:
+            mode = os.stat(path).st_mode
+        except FileNotFoundError:
+            mode = 0o644
+        start = perf_counter()
+        with Files.atomic(path, "w", prefix=f".{os.path.basename(path)}.") as file:
+            cls.dumper[format](content, file)
+            file.flush()
+            os.fsync(file.fileno())
+            os.fchmod(file.fileno(), mode)
+        Metrics.dump.labels(format.value).observe(perf_counter() - start)
+        with cls.lock:
+            cls.pending.pop((path, format), None)
+            Conditional.pending.pop(path, None)
+        cls.invalidate(path)
+
+    @classmethod
+    def current(cls: Type[Documents], path: str, format: Format) -> any:
+        with cls.lock:
+            pending = cls.pending.get((os.path.abspath(path), format))
+        return cls.read(path, format) if pending is None else deepcopy(pending.content)
+
+    @classmethod
+    def update(cls: Type[Documents], path: str, format: Format,
+               mutate: Callable[[any], any],
+               changed: Optional[Callable[[any], bool]] = None) -> any:
+        path = os.path.abspath(path)
+        key = (path, format)
+        with cls.guard(path):
+            with cls.lock:
+                pending = cls.pending.get(key)
+            content = cls.read(path, format) if pending is None else pending.content
+            res = mutate(content)
+            if changed is not None and not changed(res):
+                return res
+            if not cls.write_behind:
+                cls.dump(path, format, content)
+                return res
+            with cls.lock:
+                pending = cls.pending.setdefault(key, cls.Pending(content))
+                pending.updates += 1
+                Conditional.pending[path] = (time_ns(), pending.updates, 0)
+            if pending.updates >= cls.flush_size:
+                cls.dump(path, format, content)
+        return res
+
+    @classmethod
+    def flush(cls: Type[Documents]) -> None:
+        with cls.lock:
+            keys = list(cls.pending)
+        for path, format in keys:
+            with cls.guard(path):
+                with cls.lock:
+                    pending = cls.pending.get((path, format))
+                if pending is None:
+                    continue
+                try:
+                    cls.dump(path, format, pending.content)
+                    log.debug(f"Document {path} flushed with "
+                              f"{pending.updates} updates")
+                except OSError as err:
+                    log.error(f"Document {path} not flushed: {err}")
+
+    @classmethod
+    def run(cls: Type[Documents]) -> None:
+        while not cls.stopping.wait(cls.flush_interval):
+            cls.flush()
+
+    @classmethod
+    def start(cls: Type[Documents]) -> None:
+        if cls.write_behind and settings.get("workers", 5) > 1 \
+           and not settings.get("reload", True):
+            log.warning("Write-behind of the documents disabled, "
+                        "not supported with more than one worker")
+            cls.write_behind = False
+        if cls.write_behind and cls.flusher is None:
+            cls.stopping.clear()
+            cls.flusher = Thread(target=cls.run, name="documents-flusher",
+                                 daemon=True)
+            cls.flusher.start()
+
+    @classmethod
+    def stop(cls: Type[Documents]) -> None:
+        if cls.flusher is not None:
+            cls.stopping.set()
+            cls.flusher.join()
+            cls.flusher = None
+        cls.flush()
+
+    @classmethod
+    def store(cls: Type[Documents], key: Tuple[str, Format],
+              entry: Documents.Entry) -> None:
+        with cls.lock:
+            old = cls.entries.pop(key, None)
+            if old is not None:
+                cls.size -= old.size
+            if entry.size > cls.budget:
+                return
+            cls.entries[key] = entry
+            cls.size += entry.size
+            while cls.size > cls.budget:
+                _, evicted = cls.entries.popitem(last=False)
+                cls.size -= evicted.size
+                cls.stats["evictions"] += 1
+                Metrics.cache.labels("eviction").inc()
+
+    @classmethod
+    def invalidate(cls: Type[Documents], path: str) -> None:
+        path = os.path.abspath(path)
+        with cls.lock:
+            for key in [key for key in cls.entries if key[0] == path]:
+                cls.size -= cls.entries.pop(key).size
+                log.debug(f"Document {path} invalidated")
+
+    @classmethod
+    def clear(cls: Type[Documents]) -> None:
+        with cls.lock:
+            cls.entries.clear()
+            cls.size = 0
@@ -0,0 +1,157 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+from asyncio import AbstractEventLoop, Queue, Semaphore, StreamReader
+from asyncio.subprocess import PIPE
+from contextlib import suppress
+from subprocess import CompletedProcess
+from typing import (AsyncIterator, Awaitable, Callable, Dict, List, Optional,
+                    Set, Tuple, Type, TypeVar)
+from weakref import WeakKeyDictionary
+
+from libs.capture import Capture
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+Result = TypeVar("Result")
+
+
+class Executor:
+    limit: int = settings.get("commands-concurrency", 8)
+    buffer: int = settings.get("commands-stream-buffer", 64)
+    line_limit: int = 1024 * 1024
+    semaphores: WeakKeyDictionary[AbstractEventLoop, Semaphore] = WeakKeyDictionary()
+
+    @classmethod
+    def slot(cls: Type[Executor]) -> Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in cls.semaphores:
+            cls.semaphores[loop] = Semaphore(cls.limit)
+        return cls.semaphores[loop]
+
+    @staticmethod
+    async def run(script: str) -> CompletedProcess[Capture]:
+        stdout, stderr = Capture.pair()
+        proc = await asyncio.create_subprocess_shell(script, stdout=PIPE,
+                                                     stderr=PIPE,
+                                                     start_new_session=True)
+        try:
+            await asyncio.gather(stdout.drain(proc.stdout),
+                                 stderr.drain(proc.stderr))
+            await proc.wait()
+        except asyncio.CancelledError:
+            log.warning(f"Execution of {script} cancelled, killing it")
+            with suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+            raise
+        finally:
+            stdout.close()
+            stderr.close()
+        return CompletedProcess(script, returncode=proc.returncode,
+                                stdout=stdout, stderr=stderr)
+
+    @classmethod
+    async def stream(cls: Type[Executor],
+                     script: str) -> AsyncIterator[Tuple[str, str]]:
+        queue: Queue[Optional[Tuple[str, str]]] = Queue(maxsize=cls.buffer)
+
+        async def __read(channel: str, reader: StreamReader) -> None:
+            try:
+                async for line in Capture(line_limit=cls.line_limit).iterate(reader):
+                    await queue.put((channel, line))
+            finally:
+                await queue.put(None)
+
+        async with cls.slot():
+            proc = await asyncio.create_subprocess_shell(script, stdout=PIPE,
+                                                         stderr=PIPE,
+                                                         start_new_session=True)
+            readers = [asyncio.ensure_future(__read("stdout", proc.stdout)),
+                       asyncio.ensure_future(__read("stderr", proc.stderr))]
+            try:
+                running = len(readers)
+                while running:
+                    item = await queue.get()
+                    if item is None:
+                        running -= 1
+                    else:
+                        yield item
+                yield "exit", str(await proc.wait())
+            finally:
+                for reader in readers:
+                    reader.cancel()
+                if proc.returncode is None:
+                    log.warning(f"Streaming of {script} interrupted, killing it")
+                    with suppress(ProcessLookupError):
+                        os.killpg(proc.pid, signal.SIGKILL)
+
+    @staticmethod
+    def cyclic(graph: Dict[str, List[str]]) -> List[str]:
+        waiting = {node: len(set(deps)) for node, deps in graph.items()}
+        dependents: Dict[str, List[str]] = {node: [] for node in graph}
+        for node, deps in graph.items():
+            for dep in set(deps):
+                dependents[dep].append(node)
+        ready = [node for node, n in waiting.items() if not n]
+        while ready:
+            node = ready.pop()
+            del waiting[node]
+            for dependent in dependents[node]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+        return sorted(waiting)
+
+    @staticmethod
+    async def dag(graph: Dict[str, List[str]],
+                  task: Callable[[str], Awaitable[Result]],
+                  failed: Callable[[Result], bool],
+                  error: Callable[[str, Exception], Result]) -> Dict[str, Optional[Result]]:
+        waiting: Dict[str, Set[str]] = {node: set(deps) for node, deps in graph.items()}
+        dependents: Dict[str, List[str]] = {node: [] for node in graph}
+        for node, deps in graph.items():
+            for dep in deps:
+                dependents[dep].append(node)
+        res: Dict[str, Optional[Result]] = {}
+
+        def __skip(node: str) -> None:
+            if node not in res:
+                res[node] = None
+                for dependent in dependents[node]:
+                    __skip(dependent)
+
+        ready = [node for node, deps in waiting.items() if not deps]
+        running: Dict[asyncio.Future, str] = {}
+        try:
+            while ready or running:
+                for node in ready:
+                    running[asyncio.ensure_future(task(node))] = node
+                ready = []
+                done, _ = await asyncio.wait(running,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    try:
+                        res[node] = future.result()
+                    except Exception as err:
+                        log.error(f"Node {node} failed: {getattr(err, 'detail', err)}")
+                        res[node] = error(node, err)
+                    for dependent in dependents[node]:
+                        if failed(res[node]):
+                            __skip(dependent)
+                            continue
+                        waiting[dependent].discard(node)
+                        if not waiting[dependent] and dependent not in res:
+                            ready.append(dependent)
+        finally:
+            for future in running:
+                future.cancel()
+        return res
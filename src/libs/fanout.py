@@ -0,0 +1,84 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from asyncio import AbstractEventLoop
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple, Type
+from weakref import WeakKeyDictionary
+
+import httpx
+from pydantic import BaseModel
+
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class FanOut:
+    class ResultModel(BaseModel):
+        uri: str
+        error: bool
+        status_code: Optional[int]
+        detail: Optional[str]
+        content: Any
+        start: datetime
+        end: datetime
+
+    timeout: float = settings.get("chains-timeout", 5)
+    connections: int = settings.get("chains-connections", 100)
+    transport: Optional[httpx.AsyncBaseTransport] = None
+    clients: WeakKeyDictionary[AbstractEventLoop, httpx.AsyncClient] = WeakKeyDictionary()
+
+    @classmethod
+    def client(cls: Type[FanOut]) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if loop not in cls.clients:
+            limits = httpx.Limits(max_connections=cls.connections,
+                                  max_keepalive_connections=cls.connections)
+            cls.clients[loop] = httpx.AsyncClient(limits=limits,
+                                                  timeout=cls.timeout,
+                                                  transport=cls.transport)
+        return cls.clients[loop]
+
+    @classmethod
+    async def request(cls: Type[FanOut], uri: str, path: str,
+                      timeout: Optional[float] = None) -> FanOut.ResultModel:
+        url = f"{uri.rstrip('/')}/{path.lstrip('/')}"
+        start = datetime.now()
+        status_code, detail, content = None, None, None
+        try:
+            resp = await cls.client().get(url, timeout=cls.timeout if timeout is None else timeout)
+            status_code = resp.status_code
+            content = resp.json()
+            if resp.is_error:
+                detail = f"{url} returned {status_code}"
+        except httpx.TimeoutException:
+            detail = f"{url} timed out"
+        except (httpx.HTTPError, ValueError) as err:
+            detail = f"{url} failed: {err}"
+        if detail is not None:
+            log.warning(f"Chain request {detail}")
+        return cls.ResultModel(uri=uri, error=detail is not None,
+                               status_code=status_code, detail=detail,
+                               content=content, start=start,
+                               end=datetime.now())
+
+    @classmethod
+    async def gather(
+        cls: Type[FanOut], nodes: Dict[str, Tuple[str, Optional[float]]],
+        path: str
+    ) -> Dict[str, FanOut.ResultModel]:
+        res = await asyncio.gather(*[cls.request(uri, path, timeout)
+                                     for uri, timeout in nodes.values()])
+        return dict(zip(nodes.keys(), res))
+
+    @classmethod
+    async def close(cls: Type[FanOut]) -> None:
+        loop = asyncio.get_running_loop()
+        client = cls.clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
@@ -0,0 +1,43 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager, suppress
+from typing import IO, Container, Dict, Iterator, List
+
+
+class Files:
+    @staticmethod
+    @contextmanager
+    def atomic(path: str, mode: str = "wb", prefix: str = "tmp") -> Iterator[IO]:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=prefix)
+        try:
+            with os.fdopen(fd, mode) as file:
+                yield file
+            os.replace(tmp_path, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def rotate(path: str, keep: int, live: Container[str] = ()) -> None:
+        groups: Dict[str, List[str]] = {}
+        mtimes: Dict[str, float] = {}
+        for entry in os.scandir(path):
+            id = entry.name.partition(".")[0]
+            if entry.name.startswith("tmp") or id in live:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            groups.setdefault(id, []).append(entry.path)
+            mtimes[id] = max(mtimes.get(id, 0), mtime)
+        for id in sorted(mtimes, key=mtimes.get)[:max(0, len(mtimes) - keep)]:
+            for file_path in groups[id]:
+                with suppress(FileNotFoundError):
+                    os.remove(file_path)
@@ -0,0 +1,177 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+from datetime import datetime
+from enum import Enum
+from itertools import count
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type
+from uuid import uuid4
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from libs.base import Base
+from libs.files import Files
+from libs.metrics import Metrics
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class Status(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class Jobs:
+    class JobModel(BaseModel):
+        id: str
+        command: str
+        status: Status
+        priority: int
+        submitted: datetime
+        start: Optional[datetime]
+        end: Optional[datetime]
+        result: Optional[Base.ActionModel]
+        detail: Optional[str]
+
+    class Job:
+        def __init__(self: Jobs.Job, model: Jobs.JobModel,
+                     run: Callable[[], Awaitable[Base.ActionModel]],
+                     limit: Optional[int]) -> None:
+            self.model = model
+            self.run = run
+            self.limit = limit
+
+    workers: int = settings.get("jobs-workers", 4)
+    queue_size: int = settings.get("jobs-queue", 100)
+    path: str = settings.get("jobs-dir", ".cache/jobs")
+    keep: int = settings.get("jobs-keep", 1000)
+    pending: List[Tuple[int, int, Jobs.Job]] = []
+    running: Dict[str, int] = {}
+    tasks: Dict[asyncio.Future, Jobs.Job] = {}
+    live: Set[str] = set()
+    counter = count()
+    active: int = 0
+    average: float = 1.0
+
+    @classmethod
+    def submit(cls: Type[Jobs], command: str, priority: int,
+               limit: Optional[int],
+               run: Callable[[], Awaitable[Base.ActionModel]]) -> Jobs.JobModel:
+        if len(cls.pending) >= cls.queue_size:
+            Metrics.jobs.labels("rejected").inc()
+            raise HTTPException(status_code=429,
+                                detail=f"Queue of the jobs full ({cls.queue_size})",
+                                headers={"Retry-After": str(cls.retry_after())})
+        os.makedirs(cls.path, exist_ok=True)
+        Files.rotate(cls.path, cls.keep - 1, cls.live)
+        model = cls.JobModel(id=uuid4().hex, command=command, status=Status.queued,
+                             priority=priority, submitted=datetime.now())
+        cls.save(model)
+        cls.live.add(model.id)
+        heapq.heappush(cls.pending, (-priority, next(cls.counter), cls.Job(model, run, limit)))
+        Metrics.jobs.labels(Status.queued.value).inc()
+        cls.dispatch()
+        return model
+
+    @classmethod
+    def retry_after(cls: Type[Jobs]) -> int:
+        return max(1, math.ceil(cls.average * len(cls.pending) / cls.workers))
+
+    @classmethod
+    def dispatch(cls: Type[Jobs]) -> None:
+        blocked: List[Tuple[int, int, Jobs.Job]] = []
+        while cls.pending and cls.active < cls.workers:
+            entry = heapq.heappop(cls.pending)
+            job = entry[2]
+            command = job.model.command
+            if job.limit is not None and cls.running.get(command, 0) >= job.limit:
+                blocked.append(entry)
+                continue
+            cls.active += 1
+            cls.running[command] = cls.running.get(command, 0) + 1
+            task = asyncio.ensure_future(cls.execute(job))
+            cls.tasks[task] = job
+            task.add_done_callback(cls.done)
+        for entry in blocked:
+            heapq.heappush(cls.pending, entry)
+
+    @classmethod
+    async def execute(cls: Type[Jobs], job: Jobs.Job) -> None:
+        model = job.model
+        model.status = Status.running
+        model.start = datetime.now()
+        cls.save(model)
+        try:
+            model.result = await job.run()
+            model.status = Status.failed if model.result.error else Status.done
+        except asyncio.CancelledError:
+            model.status = Status.cancelled
+            raise
+        except Exception as err:
+            log.error(f"Job {model.id} of {model.command} failed: {err}")
+            model.status = Status.failed
+            model.detail = str(getattr(err, "detail", err))
+        finally:
+            model.end = datetime.now()
+            cls.save(model)
+            cls.average = 0.8 * cls.average + 0.2 * (model.end - model.start).total_seconds()
+            Metrics.jobs.labels(model.status.value).inc()
+            cls.live.discard(model.id)
+            cls.active -= 1
+            cls.running[model.command] -= 1
+            if not cls.running[model.command]:
+                del cls.running[model.command]
+            cls.dispatch()
+
+    @classmethod
+    def done(cls: Type[Jobs], task: asyncio.Future) -> None:
+        cls.tasks.pop(task, None)
+
+    @classmethod
+    async def stop(cls: Type[Jobs]) -> None:
+        pending, cls.pending = cls.pending, []
+        tasks = dict(cls.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in [*(job for _, _, job in pending), *tasks.values()]:
+            if job.model.status in (Status.queued, Status.running):
+                job.model.status = Status.cancelled
+                job.model.end = datetime.now()
+                cls.save(job.model)
+                Metrics.jobs.labels(Status.cancelled.value).inc()
+            cls.live.discard(job.model.id)
+        if pending or tasks:
+            log.warning(f"Jobs stopped: {len(pending)} queued and {len(tasks)} running cancelled")
+
+    @classmethod
+    def file_path(cls: Type[Jobs], id: str) -> str:
+        return os.path.join(cls.path, f"{id}.json")
+
+    @classmethod
+    def save(cls: Type[Jobs], model: Jobs.JobModel) -> None:
+        try:
+            with Files.atomic(cls.file_path(model.id)) as file:
+                file.write(Base.dumps(model.dict()))
+        except OSError as err:
+            log.error(f"Status of the job {model.id} not saved: {err}")
+
+    @classmethod
+    def read(cls: Type[Jobs], id: str) -> bytes:
+        try:
+            with open(cls.file_path(id), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Job {id} not found")
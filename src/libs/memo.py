@@ -0,0 +1,68 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from asyncio import AbstractEventLoop
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, Type
+from weakref import WeakKeyDictionary
+
+from libs.metrics import Metrics
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class Memo:
+    size: int = settings.get("commands-cache-entries", 1000)
+    entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+    flights: WeakKeyDictionary[AbstractEventLoop, Dict[Hashable, asyncio.Future]] = \
+        WeakKeyDictionary()
+
+    @classmethod
+    def pending(cls: Type[Memo]) -> Dict[Hashable, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        if loop not in cls.flights:
+            cls.flights[loop] = {}
+        return cls.flights[loop]
+
+    @classmethod
+    async def get(cls: Type[Memo], key: Hashable, ttl: float,
+                  call: Callable[[], Awaitable[Any]],
+                  cacheable: Callable[[Any], bool]) -> Any:
+        entry = cls.entries.get(key)
+        if entry is not None:
+            if entry[0] > monotonic():
+                cls.entries.move_to_end(key)
+                Metrics.memo.labels("hit").inc()
+                return entry[1]
+            del cls.entries[key]
+        flights = cls.pending()
+        flight = flights.get(key)
+        if flight is not None:
+            Metrics.memo.labels("shared").inc()
+        else:
+            Metrics.memo.labels("miss").inc()
+            flight = flights[key] = asyncio.ensure_future(
+                cls.run(key, ttl, call, cacheable))
+        return await asyncio.shield(flight)
+
+    @classmethod
+    async def run(cls: Type[Memo], key: Hashable, ttl: float,
+                  call: Callable[[], Awaitable[Any]],
+                  cacheable: Callable[[Any], bool]) -> Any:
+        try:
+            res = await call()
+        finally:
+            del cls.pending()[key]
+        if ttl > 0 and cacheable(res):
+            cls.entries[key] = (monotonic() + ttl, res)
+            while len(cls.entries) > cls.size:
+                evicted, _ = cls.entries.popitem(last=False)
+                Metrics.memo.labels("eviction").inc()
+                log.debug(f"Result of {evicted} evicted")
+        return res
@@ -0,0 +1,115 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import os
+import shutil
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Histogram, generate_latest, multiprocess)
+
+from libs.storage import settings
+
+MULTIPROC_DIR = "PROMETHEUS_MULTIPROC_DIR"
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1,
+                2.5, 5, 10, 30)
+
+
+class Metrics:
+    path: str = settings.get("metrics-dir", ".cache/metrics")
+    shared: bool = MULTIPROC_DIR in os.environ
+    content_type: str = CONTENT_TYPE_LATEST
+
+    requests = Histogram("scms_request_duration_seconds",
+                         "Duration of the HTTP requests",
+                         ["method", "router", "endpoint", "id", "status"])
+    parse = Histogram("scms_document_parse_seconds",
+                      "Duration of the parse of the files",
+                      ["format"], buckets=FAST_BUCKETS)
+    dump = Histogram("scms_document_dump_seconds",
+                     "Duration of the atomic write of the files",
+                     ["format"], buckets=FAST_BUCKETS)
+    cache = Counter("scms_document_cache",
+                    "Lookups of the parsed files cache", ["result"])
+    actions = Histogram("scms_action_duration_seconds",
+                        "Duration of the actions and of the commands",
+                        ["resource", "id", "kind"])
+    exits = Counter("scms_action_exit",
+                    "Exit codes of the actions and of the commands",
+                    ["resource", "id", "kind", "code"])
+    memo = Counter("scms_command_cache",
+                   "Lookups of the idempotent command results",
+                   ["result"])
+    jobs = Counter("scms_job", "Jobs of the commands", ["status"])
+    reloads = Histogram("scms_reload_duration_seconds",
+                        "Duration of the reload of the catalogs",
+                        ["resource"], buckets=FAST_BUCKETS)
+    reload_events = Counter("scms_reload_event",
+                            "Modifications of the settings files",
+                            ["resource"])
+    reload_results = Counter("scms_reload",
+                             "Reloads of the settings files",
+                             ["resource", "result"])
+    reload_changes = Counter("scms_reload_change",
+                             "Items changed by the reloads",
+                             ["resource", "change"])
+
+    @classmethod
+    def prepare(cls: Type[Metrics]) -> None:
+        path = os.environ.setdefault(MULTIPROC_DIR, os.path.abspath(cls.path))
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+    @classmethod
+    def generate(cls: Type[Metrics]) -> bytes:
+        if not cls.shared:
+            return generate_latest(REGISTRY)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+
+    @classmethod
+    def action(cls: Type[Metrics], resource: str, id: str, kind: str,
+               returncode: Optional[int], duration: float) -> None:
+        cls.actions.labels(resource, id, kind).observe(duration)
+        if returncode is not None:
+            cls.exits.labels(resource, id, kind, str(returncode)).inc()
+
+    class Middleware:
+        def __init__(self: Metrics.Middleware, app: Callable) -> None:
+            self.app = app
+
+        async def __call__(self: Metrics.Middleware, scope: Dict,
+                           receive: Callable[[], Awaitable[Dict]],
+                           send: Callable[[Dict], Awaitable[None]]) -> None:
+            if scope["type"] != "http":
+                await self.app(scope, receive, send)
+                return
+            start = perf_counter()
+            status = 500
+
+            async def __send(message: Dict) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await send(message)
+            try:
+                await self.app(scope, receive, __send)
+            finally:
+                Metrics.request(scope, status, perf_counter() - start)
+
+    @classmethod
+    def request(cls: Type[Metrics], scope: Dict, status: int,
+                duration: float) -> None:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            router, name, id = "", "", ""
+        else:
+            router = endpoint.__module__.rpartition(".")[2]
+            name = endpoint.__name__
+            id = scope.get("path_params", {}).get("id", "") if status < 400 else ""
+        cls.requests.labels(scope["method"], router, name, id,
+                            str(status)).observe(duration)
@@ -0,0 +1,186 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from asyncio import AbstractEventLoop
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from threading import Lock
+from typing import Deque, Iterable, List, Optional, Tuple, Type
+from weakref import WeakKeyDictionary
+
+from pydantic import BaseModel
+
+from libs.catalog import Catalog
+from libs.conditional import Conditional
+from libs.reloader import Reloader
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+
+class Change(str, Enum):
+    added = "added"
+    removed = "removed"
+    changed = "changed"
+
+
+class Notifier:
+    class EventModel(BaseModel):
+        revision: int
+        resource: str
+        id: str
+        change: Change
+        time: datetime
+
+    class WatchModel(BaseModel):
+        revision: int
+        reset: bool
+        events: List[Notifier.EventModel]
+
+    revision: int = 0
+    history: int = settings.get("watch-history", 1000)
+    events: Deque[Notifier.EventModel] = deque(maxlen=history)
+    lock: Lock = Lock()
+    wakeups: WeakKeyDictionary[AbstractEventLoop, asyncio.Event] = WeakKeyDictionary()
+    path: Optional[str] = Catalog.file("events") if Catalog.shared else None
+    writer: bool = False
+    identity: Optional[Tuple[int, int, int]] = None
+    offset: int = 0
+    lines: int = 0
+
+    @classmethod
+    def share(cls: Type[Notifier]) -> None:
+        cls.path = Catalog.file("events")
+        cls.writer = True
+        open(cls.path, "w").close()
+
+    @classmethod
+    def publish(cls: Type[Notifier], resource: str,
+                changes: Iterable[Tuple[str, Change]]) -> None:
+        changes = list(changes)
+        if not changes or (cls.path is not None and not cls.writer):
+            return
+        with cls.lock:
+            now = datetime.now()
+            events = []
+            for id, change in changes:
+                cls.revision += 1
+                events.append(cls.EventModel(revision=cls.revision, resource=resource,
+                                             id=id, change=change, time=now))
+            cls.events.extend(events)
+            if cls.writer:
+                cls.append(events)
+            loops = list(cls.wakeups.keys())
+        for loop in loops:
+            loop.call_soon_threadsafe(cls.wake, loop)
+
+    @classmethod
+    def append(cls: Type[Notifier], events: List[Notifier.EventModel]) -> None:
+        cls.lines += len(events)
+        if cls.lines <= 2 * cls.history:
+            with open(cls.path, "a") as file:
+                file.writelines(f"{event.json()}\n" for event in events)
+            return
+        cls.lines = len(cls.events)
+        Catalog.replace("events", "".join(f"{event.json()}\n"
+                                          for event in cls.events).encode())
+
+    @classmethod
+    def refresh(cls: Type[Notifier]) -> None:
+        if cls.path is None or cls.writer:
+            return
+        try:
+            identity = Conditional.identity(cls.path)
+        except FileNotFoundError:
+            return
+        with cls.lock:
+            if identity == cls.identity:
+                return
+            if cls.identity is None or identity[2] != cls.identity[2] \
+               or identity[1] < cls.offset:
+                cls.events.clear()
+                cls.offset = 0
+            with open(cls.path, "rb") as file:
+                file.seek(cls.offset)
+                data = file.read()
+            end = data.rfind(b"\n") + 1
+            cls.events.extend(cls.EventModel.parse_raw(line)
+                              for line in data[:end].splitlines())
+            cls.offset += end
+            cls.identity = identity if end == len(data) else None
+            cls.revision = cls.events[-1].revision if cls.events else 0
+
+    @classmethod
+    def current(cls: Type[Notifier]) -> int:
+        cls.refresh()
+        return cls.revision
+
+    @classmethod
+    def wake(cls: Type[Notifier], loop: AbstractEventLoop) -> None:
+        event = cls.wakeups.pop(loop, None)
+        if event is not None:
+            event.set()
+
+    @classmethod
+    def since(cls: Type[Notifier], revision: int,
+              resources: Optional[List[str]] = None) -> Notifier.WatchModel:
+        cls.refresh()
+        with cls.lock:
+            first = cls.events[0].revision if cls.events else cls.revision + 1
+            reset = revision > cls.revision or revision < first - 1
+            start = max(0, revision + 1 - first)
+            events = [event for event in islice(cls.events, start, None)
+                      if not resources or event.resource in resources]
+            return cls.WatchModel(revision=cls.revision, reset=reset,
+                                  events=[] if reset else events)
+
+    @classmethod
+    async def wait(cls: Type[Notifier], revision: int,
+                   resources: Optional[List[str]] = None,
+                   timeout: float = 0) -> Notifier.WatchModel:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            wakeup = cls.wakeups.setdefault(loop, asyncio.Event())
+            res = cls.since(revision, resources)
+            remaining = deadline - loop.time()
+            if res.events or res.reset or remaining <= 0:
+                return res
+            if cls.path is not None and not cls.writer:
+                remaining = min(remaining, Catalog.poll_interval)
+            try:
+                await asyncio.wait_for(wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def on_reload(cls: Type[Notifier], router_klass: any,
+                  diff: Optional[Reloader.Diff]) -> None:
+        if cls.path is not None and not cls.writer:
+            return
+        if diff is not None:
+            cls.publish(router_klass.label,
+                        [(id, Change(change)) for change, ids in diff._asdict().items()
+                         for id in ids])
+        for path in router_klass.targets:
+            Reloader.watch(path, cls.on_file)
+
+    @classmethod
+    def on_file(cls: Type[Notifier], path: str) -> None:
+        path = os.path.abspath(path)
+        for router_klass in Reloader.router_klasses.values():
+            ids = router_klass.targets.get(path, [])
+            if ids:
+                log.info(f"File {path} changed, notify {router_klass.label}s {ids}")
+                cls.publish(router_klass.label, [(id, Change.changed) for id in ids])
+
+
+Notifier.WatchModel.update_forward_refs()
+Reloader.add_listener(Notifier.on_reload)
@@ -0,0 +1,131 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import Any, Dict, List, Tuple, Type
+
+from fastapi import HTTPException
+
+MERGE_PATCH = "application/merge-patch+json"
+JSON_PATCH = "application/json-patch+json"
+
+
+class Patch:
+    @classmethod
+    def merge(cls: Type[Patch], target: Any, patch: Any) -> Any:
+        if not isinstance(patch, dict):
+            return deepcopy(patch)
+        if not isinstance(target, dict):
+            target = {}
+        for key, value in patch.items():
+            if value is None:
+                target.pop(key, None)
+            else:
+                target[key] = cls.merge(target.get(key), value)
+        return target
+
+    @classmethod
+    def apply(cls: Type[Patch], doc: Any, ops: List[Dict[str, Any]]) -> Any:
+        if not isinstance(ops, list):
+            raise HTTPException(status_code=422,
+                                detail="JSON Patch must be a list of operations")
+        for n, op in enumerate(ops):
+            try:
+                doc = cls.operation(doc, op)
+            except (KeyError, IndexError, TypeError, ValueError) as err:
+                raise HTTPException(status_code=422,
+                                    detail=f"JSON Patch operation {n} "
+                                    f"not valid: {err}") from err
+        return doc
+
+    @classmethod
+    def operation(cls: Type[Patch], doc: Any, op: Dict[str, Any]) -> Any:
+        name, path = op["op"], op["path"]
+        if name == "add":
+            return cls.add(doc, path, deepcopy(op["value"]))
+        if name == "remove":
+            return cls.remove(doc, path)[0]
+        if name == "replace":
+            doc = cls.remove(doc, path)[0]
+            return cls.add(doc, path, deepcopy(op["value"]))
+        if name == "move":
+            if path.startswith(f"{op['from']}/"):
+                raise ValueError(f"cannot move {op['from']} into {path}")
+            doc, value = cls.remove(doc, op["from"])
+            return cls.add(doc, path, value)
+        if name == "copy":
+            return cls.add(doc, path, deepcopy(cls.get(doc, op["from"])))
+        if name == "test":
+            if cls.get(doc, path) != op["value"]:
+                raise HTTPException(status_code=409,
+                                    detail=f"JSON Patch test failed on {path}")
+            return doc
+        raise ValueError(f"operation {name} unknown")
+
+    @staticmethod
+    def pointer(path: str) -> List[str]:
+        if path == "":
+            return []
+        if not path.startswith("/"):
+            raise ValueError(f"pointer {path} must start with /")
+        return [token.replace("~1", "/").replace("~0", "~")
+                for token in path[1:].split("/")]
+
+    @staticmethod
+    def index(container: List, token: str, append: bool = False) -> int:
+        if append and token == "-":
+            return len(container)
+        if not token.isdigit() or (token != "0" and token.startswith("0")):
+            raise ValueError(f"index {token} not valid")
+        index = int(token)
+        if index > len(container) or (not append and index == len(container)):
+            raise IndexError(f"index {token} out of range")
+        return index
+
+    @classmethod
+    def parent(cls: Type[Patch], doc: Any, path: str) -> Tuple[Any, str]:
+        tokens = cls.pointer(path)
+        if not tokens:
+            raise ValueError("pointer to the root has no parent")
+        return cls.resolve(doc, tokens[:-1]), tokens[-1]
+
+    @classmethod
+    def resolve(cls: Type[Patch], doc: Any, tokens: List[str]) -> Any:
+        for token in tokens:
+            if isinstance(doc, list):
+                doc = doc[cls.index(doc, token)]
+            elif isinstance(doc, dict):
+                doc = doc[token]
+            else:
+                raise KeyError(token)
+        return doc
+
+    @classmethod
+    def get(cls: Type[Patch], doc: Any, path: str) -> Any:
+        return cls.resolve(doc, cls.pointer(path))
+
+    @classmethod
+    def add(cls: Type[Patch], doc: Any, path: str, value: Any) -> Any:
+        if path == "":
+            return value
+        container, token = cls.parent(doc, path)
+        if isinstance(container, list):
+            container.insert(cls.index(container, token, append=True), value)
+        elif isinstance(container, dict):
+            container[token] = value
+        else:
+            raise KeyError(token)
+        return doc
+
+    @classmethod
+    def remove(cls: Type[Patch], doc: Any, path: str) -> Tuple[Any, Any]:
+        if path == "":
+            return None, doc
+        container, token = cls.parent(doc, path)
+        if isinstance(container, list):
+            return doc, container.pop(cls.index(container, token))
+        if isinstance(container, dict):
+            return doc, container.pop(token)
+        raise KeyError(token)
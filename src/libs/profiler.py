@@ -0,0 +1,199 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from contextvars import Context, ContextVar
+from itertools import count
+from threading import Event, Thread
+from time import time
+from types import FrameType
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+
+from libs.files import Files
+from libs.storage import settings
+
+log = logging.getLogger(__name__)
+
+INLINE = "inline"
+IDLE = frozenset([("threading", "wait"), ("selectors", "select"),
+                  ("queue", "get"), ("concurrent.futures.thread", "_worker"),
+                  ("asyncio.runners", "run"), ("uvicorn.server", "run"),
+                  ("watchdog.observers.inotify_c", "do_poll")])
+POOL = ("concurrent.futures.thread", "run")
+
+
+class Profiler:
+    class Sampler(Thread):
+        def __init__(self: Profiler.Sampler, interval: float) -> None:
+            super().__init__(name="profiler-sampler", daemon=True)
+            self.interval = interval
+            self.serving = threading.get_ident()
+            self.stopping = Event()
+            self.samples: Counter[Tuple[str, ...]] = Counter()
+            self.names: Dict[int, str] = {}
+
+        def run(self: Profiler.Sampler) -> None:
+            while not self.stopping.wait(self.interval):
+                self.sample()
+
+        def sample(self: Profiler.Sampler) -> None:
+            for ident, frame in sys._current_frames().items():
+                if ident != self.serving and not Profiler.runs(frame, self):
+                    continue
+                if Profiler.idle(frame):
+                    continue
+                name = self.names.get(ident)
+                if name is None:
+                    name = self.names[ident] = Profiler.thread_name(ident)
+                self.samples[(name, *Profiler.stack(frame))] += 1
+
+        def collapse(self: Profiler.Sampler) -> str:
+            return "".join(f"{';'.join(stack)} {n}\n"
+                           for stack, n in self.samples.most_common())
+
+        def stop(self: Profiler.Sampler) -> str:
+            self.stopping.set()
+            self.join()
+            return self.collapse()
+
+    enabled: bool = settings.get("profiling", False)
+    header: bytes = settings.get("profiling-header", "X-Profile").lower().encode()
+    interval: float = settings.get("profiling-interval", 0.001)
+    path: str = settings.get("profiling-dir", ".cache/profiles")
+    keep: int = settings.get("profiling-keep", 50)
+    current: ContextVar[Optional[Profiler.Sampler]] = ContextVar("profiler", default=None)
+    counter = count()
+
+    @staticmethod
+    def idle(frame: FrameType) -> bool:
+        return (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE
+
+    @classmethod
+    def runs(cls: Type[Profiler], frame: Optional[FrameType],
+             sampler: Profiler.Sampler) -> bool:
+        while frame is not None:
+            if (frame.f_globals.get("__name__"), frame.f_code.co_name) == POOL:
+                run = getattr(frame.f_locals.get("self"), "fn", None)
+                context = getattr(run, "__self__", None)
+                return isinstance(context, Context) and context.get(cls.current) is sampler
+            frame = frame.f_back
+        return False
+
+    @staticmethod
+    def stack(frame: Optional[FrameType]) -> List[str]:
+        res = []
+        while frame is not None:
+            res.append(f"{frame.f_globals.get('__name__', '?')}:"
+                       f"{frame.f_code.co_name}")
+            frame = frame.f_back
+        res.reverse()
+        return res
+
+    @staticmethod
+    def thread_name(ident: int) -> str:
+        for thread in threading.enumerate():
+            if thread.ident == ident:
+                return thread.name
+        return str(ident)
+
+    @classmethod
+    def new_id(cls: Type[Profiler]) -> str:
+        return f"{int(time() * 1000)}-{os.getpid()}-{next(cls.counter)}"
+
+    @classmethod
+    def save(cls: Type[Profiler], id: str, profile: str) -> None:
+        os.makedirs(cls.path, exist_ok=True)
+        with open(os.path.join(cls.path, f"{id}.txt"), "w") as file:
+            file.write(profile)
+        Files.rotate(cls.path, cls.keep)
+
+    @classmethod
+    def list(cls: Type[Profiler]) -> List[str]:
+        try:
+            names = os.listdir(cls.path)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-4] for name in names if name.endswith(".txt")]
+        return sorted(ids, key=lambda id: tuple(map(int, id.split("-"))))
+
+    @classmethod
+    def load(cls: Type[Profiler], id: str) -> str:
+        if id not in cls.list():
+            raise HTTPException(status_code=404, detail=f"Profile {id} not found")
+        with open(os.path.join(cls.path, f"{id}.txt")) as file:
+            return file.read()
+
+    class Middleware:
+        def __init__(self: Profiler.Middleware, app: Callable) -> None:
+            self.app = app
+
+        async def __call__(self: Profiler.Middleware, scope: Dict,
+                           receive: Callable[[], Awaitable[Dict]],
+                           send: Callable[[Dict], Awaitable[None]]) -> None:
+            mode = None
+            if scope["type"] == "http":
+                for key, value in scope["headers"]:
+                    if key == Profiler.header:
+                        mode = value.decode("latin-1")
+                        break
+            if mode is None:
+                await self.app(scope, receive, send)
+                return
+            if mode == INLINE:
+                await Profiler.inline(self.app, scope, receive, send)
+            else:
+                await Profiler.record(self.app, scope, receive, send)
+
+    @classmethod
+    async def record(cls: Type[Profiler], app: Callable, scope: Dict,
+                     receive: Callable[[], Awaitable[Dict]],
+                     send: Callable[[Dict], Awaitable[None]]) -> None:
+        id = cls.new_id()
+
+        async def __send(message: Dict) -> None:
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=[
+                    *message.get("headers", []),
+                    (cls.header + b"-id", id.encode())])
+            await send(message)
+        sampler = cls.Sampler(cls.interval)
+        sampler.start()
+        token = cls.current.set(sampler)
+        try:
+            await app(scope, receive, __send)
+        finally:
+            cls.current.reset(token)
+            cls.save(id, sampler.stop())
+            log.info(f"Profile of {scope['method']} {scope['path']} saved as {id}")
+
+    @classmethod
+    async def inline(cls: Type[Profiler], app: Callable, scope: Dict,
+                     receive: Callable[[], Awaitable[Dict]],
+                     send: Callable[[Dict], Awaitable[None]]) -> None:
+        status = 500
+
+        async def __send(message: Dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+        sampler = cls.Sampler(cls.interval)
+        sampler.start()
+        token = cls.current.set(sampler)
+        try:
+            await app(scope, receive, __send)
+        finally:
+            cls.current.reset(token)
+            body = sampler.stop().encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode()),
+                                (cls.header + b"-status", str(status).encode())]})
+        await send({"type": "http.response.body", "body": body})
@@ -2,16 +2,38 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Dict, Type
+from functools import partial
+from threading import Lock, Timer, current_thread
+from typing import (Callable, Dict, List, Mapping, NamedTuple, Optional, Set,
+                    Tuple, Type)
 
-from watchdog.events import FileModifiedEvent, PatternMatchingEventHandler
+from watchdog.events import (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                             EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED,
+                             FileSystemEvent, FileSystemEventHandler,
+                             FileSystemMovedEvent,
+                             PatternMatchingEventHandler)
 from watchdog.observers import Observer
 
+from libs.metrics import Metrics
+from libs.storage import settings
+
 log = logging.getLogger(__name__)
 
 
 class Reloader:
+    class Diff(NamedTuple):
+        added: List[str]
+        removed: List[str]
+        changed: List[str]
+
     router_klasses: Dict[str, any] = {}
+    listeners: List[Callable[[any, Optional[Reloader.Diff]], None]] = []
+    watched: Set[Tuple[str, Callable]] = set()
+    timers: Dict[str, Timer] = {}
+    window: float = settings.get("reload-debounce", 0.2)
+    lock: Lock = Lock()
+    changes: Set[str] = {EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                         EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED}
 
     @classmethod
     def add_router_klass(cls: Type[Reloader], pattern: str,
@@ -19,16 +41,36 @@ class Reloader:
         cls.router_klasses[pattern] = router_klass
 
     @classmethod
-    def start(cls: Type[Reloader], path: str, join_observer: bool = False) -> None:
+    def add_listener(cls: Type[Reloader],
+                     listener: Callable[[any, Optional[Reloader.Diff]], None]) -> None:
+        cls.listeners.append(listener)
+
+    @classmethod
+    def notify(cls: Type[Reloader], router_klass: any,
+               diff: Optional[Reloader.Diff]) -> None:
+        for listener in cls.listeners:
+            try:
+                listener(router_klass, diff)
+            except Exception as err:
+                log.exception(f"Listener {listener} failed: {err}")
+
+    @classmethod
+    def start(cls: Type[Reloader], path: str, join_observer: bool = False,
+              catalogs: bool = True) -> None:
         for klass in cls.router_klasses.values():
             klass.init()
-        event_handler = PatternMatchingEventHandler(patterns=cls.router_klasses.keys())
-        event_handler.on_modified = cls.on_modified
         cls.observer = Observer()
-        cls.observer.schedule(event_handler, path, recursive=False)
+        if catalogs:
+            event_handler = PatternMatchingEventHandler(patterns=cls.router_klasses.keys())
+            event_handler.on_modified = cls.on_modified
+            event_handler.on_created = cls.on_modified
+            event_handler.on_moved = cls.on_moved
+            cls.observer.schedule(event_handler, path, recursive=False)
+            log.info(f"Reload on {path}")
         cls.observer.start()
         cls.path = path
-        log.info(f"Reload on {path}")
+        for klass in cls.router_klasses.values():
+            cls.notify(klass, None)
         if join_observer:
             cls.observer.join()
 
@@ -36,11 +78,113 @@ class Reloader:
     def stop(cls: Type[Reloader]):
         log.info(f"Stop reloader on {cls.path}")
         cls.observer.stop()
+        cls.watched.clear()
+        with cls.lock:
+            for timer in cls.timers.values():
+                timer.cancel()
+            cls.timers.clear()
 
-    @ classmethod
-    def on_modified(cls: Type[Reloader], event: FileModifiedEvent) -> None:
-        key: str = event.src_path.replace(f'{os.getcwd()}/', '')
-        log.warning(f"File {key} changed, reloading...")
-        router_klass = cls.router_klasses[key]
-        router_klass.init()
-        router_klass.storage.load()
+    @classmethod
+    def watch(cls: Type[Reloader], path: str,
+              callback: Callable[[str], None]) -> None:
+        def __on_any_event(event: FileSystemEvent) -> None:
+            if event.event_type not in cls.changes:
+                return
+            callback(event.src_path)
+            if getattr(event, "dest_path", None):
+                callback(event.dest_path)
+
+        folder = os.path.dirname(os.path.abspath(path))
+        with cls.lock:
+            if (folder, callback) in cls.watched or not getattr(cls, "observer", None) \
+               or not cls.observer.is_alive():
+                return
+            event_handler = FileSystemEventHandler()
+            event_handler.on_any_event = __on_any_event
+            cls.observer.schedule(event_handler, folder, recursive=False)
+            cls.watched.add((folder, callback))
+        log.info(f"Watch documents in {folder}")
+
+    @classmethod
+    def debounce(cls: Type[Reloader], key: str, callback: Callable[[], None]) -> None:
+        if cls.window <= 0:
+            cls.fire(key, callback)
+            return
+        timer = Timer(cls.window, cls.fire, (key, callback))
+        timer.daemon = True
+        with cls.lock:
+            previous = cls.timers.get(key)
+            if previous is not None:
+                previous.cancel()
+            cls.timers[key] = timer
+        timer.start()
+
+    @classmethod
+    def fire(cls: Type[Reloader], key: str, callback: Callable[[], None]) -> None:
+        with cls.lock:
+            if cls.timers.get(key) is current_thread():
+                del cls.timers[key]
+        try:
+            callback()
+        except Exception as err:
+            log.exception(f"Reload of {key} failed: {err}")
+
+    @classmethod
+    def on_modified(cls: Type[Reloader], event: FileSystemEvent) -> None:
+        cls.on_change(event.src_path)
+
+    @classmethod
+    def on_moved(cls: Type[Reloader], event: FileSystemMovedEvent) -> None:
+        cls.on_change(event.dest_path)
+
+    @classmethod
+    def on_change(cls: Type[Reloader], path: str) -> None:
+        key: str = path.replace(f'{os.getcwd()}/', '')
+        router_klass = cls.router_klasses.get(key)
+        if router_klass is None:
+            return
+        Metrics.reload_events.labels(router_klass.label).inc()
+        log.debug(f"File {key} changed, reload in {cls.window} s")
+        cls.debounce(key, partial(cls.reload, router_klass))
+
+    @staticmethod
+    def diff(old: Mapping, new: Mapping) -> Reloader.Diff:
+        old_raw, new_raw = getattr(old, "raw", None), getattr(new, "raw", None)
+
+        def __same(id: str) -> bool:
+            if old_raw is not None and new_raw is not None and old_raw(id) == new_raw(id):
+                return True
+            return old[id] == new[id]
+
+        diff = Reloader.Diff([], [id for id in old if id not in new], [])
+        for id in new:
+            if id not in old:
+                diff.added.append(id)
+            elif not __same(id):
+                diff.changed.append(id)
+        return diff
+
+    @classmethod
+    def reload(cls: Type[Reloader], router_klass: any) -> Optional[Reloader.Diff]:
+        storage = router_klass.storage
+        label = router_klass.label
+        log.warning(f"File {storage.path} changed, reloading...")
+        with Metrics.reloads.labels(label).time():
+            old = storage.root() or {}
+            try:
+                storage.load()
+            except Exception as err:
+                Metrics.reload_results.labels(label, "failed").inc()
+                log.error(f"Reload of {storage.path} failed, "
+                          f"keeping the previous {label}s: {err}")
+                return None
+            diff = cls.diff(old, storage.root() or {})
+            router_klass.init(old, diff)
+        Metrics.reload_results.labels(label, "changed" if any(diff) else "unchanged").inc()
+        for change, ids in diff._asdict().items():
+            if ids:
+                Metrics.reload_changes.labels(label, change).inc(len(ids))
+        log.info(f"Reload of {storage.path}: {len(diff.added)} added, "
+                 f"{len(diff.removed)} removed, {len(diff.changed)} changed")
+        cls.notify(router_klass, diff)
+        return diff
@@ -0,0 +1,277 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from typing import (Any, BinaryIO, Dict, Hashable, Iterator, List, Optional,
+                    Tuple, Type)
+
+from libs.xpath import MISSING, WILDCARD, XPath
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+STRING_PATTERN = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+STRING = re.compile(STRING_PATTERN)
+TOKEN = re.compile(STRING_PATTERN + rb"|[{}\[\]]")
+SCALAR_PATTERN = rb"[^,:\[\]{}\"\s]+"
+SCALAR = re.compile(SCALAR_PATTERN)
+OPEN = frozenset(b"{[")
+CLOSE = frozenset(b"}]")
+
+
+def container(depth: int) -> bytes:
+    inner = rb'(?:[^"{}\[\]]+(?=["{}\[\]])|' + STRING_PATTERN
+    if depth > 1:
+        inner += rb"|" + container(depth - 1)
+    inner += rb")*"
+    return rb"(?:\{" + inner + rb"\}|\[" + inner + rb"\])"
+
+
+CONTAINER_PATTERN = container(5)
+CONTAINER = re.compile(CONTAINER_PATTERN)
+VALUE_PATTERN = rb"(?:" + CONTAINER_PATTERN + rb"|" + STRING_PATTERN + \
+    rb"|" + SCALAR_PATTERN + rb")[ \t\n\r]*"
+MEMBER = re.compile(rb"(" + STRING_PATTERN + rb")[ \t\n\r]*:[ \t\n\r]*" +
+                    VALUE_PATTERN + rb"(?:,[ \t\n\r]*|(}))")
+ITEM = re.compile(VALUE_PATTERN + rb"(?:,[ \t\n\r]*|(]))")
+
+
+class Scanner:
+    class Done(Exception):
+        pass
+
+    chunk_size: int = 1024 * 1024
+
+    @staticmethod
+    @contextmanager
+    def open(path: str) -> Iterator[mmap.mmap]:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise json.JSONDecodeError("Expecting value", "", 0)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                yield buf
+
+    @classmethod
+    def get(cls: Type[Scanner], path: str, xpath: List[str]) -> Any:
+        return cls.extract(path, XPath.compile({None: xpath}))[None]
+
+    @classmethod
+    def extract(cls: Type[Scanner], path: str,
+                trie: XPath.Node) -> Dict[Hashable, Any]:
+        res: Dict[Hashable, Any] = {}
+        with cls.open(path) as buf:
+            try:
+                cls.walk(trie, buf, 0, res, sum(1 for _ in trie.descendants()))
+            except cls.Done:
+                pass
+        return res
+
+    @classmethod
+    def chunks(cls: Type[Scanner], path: str) -> Iterator[bytes]:
+        return cls.read(open(path, "rb"))
+
+    @classmethod
+    def read(cls: Type[Scanner], file: BinaryIO) -> Iterator[bytes]:
+        with file:
+            chunk = file.read(cls.chunk_size)
+            while chunk:
+                yield chunk
+                chunk = file.read(cls.chunk_size)
+
+    @classmethod
+    def walk(cls: Type[Scanner], node: XPath.Node, buf: mmap.mmap, pos: int,
+             res: Dict[Hashable, Any], total: Optional[int] = None) -> int:
+        pos = cls.skip(buf, pos)
+        char = cls.at(buf, pos)
+        if node.keys or not node.children or char not in OPEN:
+            end = cls.end(buf, pos)
+            XPath.walk(node, json.loads(buf[pos:end]), res)
+            return end
+        if char == ord("{"):
+            return cls.walk_object(node, buf, pos, res, total)
+        return cls.walk_list(node, buf, pos, res, total)
+
+    @classmethod
+    def walk_object(cls: Type[Scanner], node: XPath.Node, buf: mmap.mmap,
+                    pos: int, res: Dict[Hashable, Any],
+                    total: Optional[int]) -> int:
+        children = dict(node.children)
+        wildcard = children.pop(WILDCARD, None)
+        parts: List[Dict[Hashable, Any]] = []
+        pos = cls.skip(buf, pos + 1)
+        if cls.at(buf, pos) == ord("}"):
+            pos += 1
+        else:
+            while True:
+                match = MEMBER.match(buf, pos)
+                if match is not None and wildcard is None and \
+                   cls.key(match.group(1)) not in children:
+                    pos = match.end()
+                    if match.group(2):
+                        break
+                    continue
+                match = STRING.match(buf, pos)
+                if match is None:
+                    raise cls.error("Expecting property name", pos)
+                key = cls.key(match.group())
+                pos = cls.skip(buf, match.end())
+                if cls.at(buf, pos) != ord(":"):
+                    raise cls.error("Expecting ':' delimiter", pos)
+                pos = cls.skip(buf, pos + 1)
+                child = children.pop(key, None)
+                end = cls.visit([] if child is None else [child], wildcard,
+                                buf, pos, res, parts, total)
+                pos, last = cls.separator(buf, end, ord("}"))
+                if last:
+                    break
+        return cls.finish(children.values(), wildcard, parts, res, total, pos)
+
+    @classmethod
+    def walk_list(cls: Type[Scanner], node: XPath.Node, buf: mmap.mmap,
+                  pos: int, res: Dict[Hashable, Any],
+                  total: Optional[int]) -> int:
+        positive: Dict[int, List[XPath.Node]] = {}
+        negative: List[Tuple[int, XPath.Node]] = []
+        missing: List[XPath.Node] = []
+        wildcard = None
+        for token, child in node.children.items():
+            if token == WILDCARD:
+                wildcard = child
+            elif token.lstrip("-").isdigit():
+                index = int(token)
+                if index < 0:
+                    negative.append((index, child))
+                else:
+                    positive.setdefault(index, []).append(child)
+            else:
+                missing.append(child)
+        offsets: Optional[List[int]] = [] if negative else None
+        parts: List[Dict[Hashable, Any]] = []
+        pos = cls.skip(buf, pos + 1)
+        if cls.at(buf, pos) == ord("]"):
+            pos += 1
+        else:
+            index = 0
+            while True:
+                if offsets is not None:
+                    offsets.append(pos)
+                elif wildcard is None and index not in positive:
+                    match = ITEM.match(buf, pos)
+                    if match is not None:
+                        pos = match.end()
+                        if match.group(1):
+                            break
+                        index += 1
+                        continue
+                end = cls.visit(positive.pop(index, []), wildcard, buf, pos,
+                                res, parts, total)
+                pos, last = cls.separator(buf, end, ord("]"))
+                if last:
+                    break
+                index += 1
+        for index, child in negative:
+            if -index <= len(offsets):
+                cls.walk(child, buf, offsets[index], res, total)
+            else:
+                missing.append(child)
+        for children in positive.values():
+            missing.extend(children)
+        return cls.finish(missing, wildcard, parts, res, total, pos)
+
+    @classmethod
+    def visit(cls: Type[Scanner], children: List[XPath.Node],
+              wildcard: Optional[XPath.Node], buf: mmap.mmap, pos: int,
+              res: Dict[Hashable, Any], parts: List[Dict[Hashable, Any]],
+              total: Optional[int]) -> int:
+        end = None
+        for child in children:
+            end = cls.walk(child, buf, pos, res, total)
+            cls.check(res, total)
+        if wildcard is not None:
+            parts.append({})
+            end = cls.walk(wildcard, buf, pos, parts[-1])
+        return cls.end(buf, pos) if end is None else end
+
+    @classmethod
+    def finish(cls: Type[Scanner], missing: Iterator[XPath.Node],
+               wildcard: Optional[XPath.Node],
+               parts: List[Dict[Hashable, Any]], res: Dict[Hashable, Any],
+               total: Optional[int], pos: int) -> int:
+        for child in missing:
+            XPath.walk(child, MISSING, res)
+        if wildcard is not None:
+            for key in wildcard.descendants():
+                res[key] = [part[key] for part in parts
+                            if part[key] is not MISSING]
+        cls.check(res, total)
+        return pos
+
+    @classmethod
+    def check(cls: Type[Scanner], res: Dict[Hashable, Any],
+              total: Optional[int]) -> None:
+        if total is not None and len(res) >= total:
+            raise cls.Done()
+
+    @classmethod
+    def separator(cls: Type[Scanner], buf: mmap.mmap, pos: int,
+                  close: int) -> Tuple[int, bool]:
+        pos = cls.skip(buf, pos)
+        char = cls.at(buf, pos)
+        if char == ord(","):
+            return cls.skip(buf, pos + 1), False
+        if char == close:
+            return pos + 1, True
+        raise cls.error(f"Expecting ',' or '{chr(close)}' delimiter", pos)
+
+    @classmethod
+    def end(cls: Type[Scanner], buf: mmap.mmap, pos: int) -> int:
+        char = cls.at(buf, pos)
+        if char == ord('"'):
+            match = STRING.match(buf, pos)
+            if match is None:
+                raise cls.error("Unterminated string", pos)
+            return match.end()
+        if char in OPEN:
+            depth = 0
+            while True:
+                match = TOKEN.search(buf, pos)
+                if match is None:
+                    raise cls.error("Unterminated container", pos)
+                char = buf[match.start()]
+                if char in OPEN:
+                    nested = CONTAINER.match(buf, match.start())
+                    if nested is not None:
+                        if not depth:
+                            return nested.end()
+                        pos = nested.end()
+                        continue
+                    depth += 1
+                elif char in CLOSE:
+                    depth -= 1
+                    if not depth:
+                        return match.end()
+                pos = match.end()
+        match = SCALAR.match(buf, pos)
+        if match is None:
+            raise cls.error("Expecting value", pos)
+        return match.end()
+
+    @staticmethod
+    def key(string: bytes) -> str:
+        return json.loads(string) if b"\\" in string else string[1:-1].decode()
+
+    @staticmethod
+    def skip(buf: mmap.mmap, pos: int) -> int:
+        return WHITESPACE.match(buf, pos).end()
+
+    @staticmethod
+    def at(buf: mmap.mmap, pos: int) -> int:
+        return buf[pos] if pos < len(buf) else -1
+
+    @staticmethod
+    def error(msg: str, pos: int) -> json.JSONDecodeError:
+        return json.JSONDecodeError(msg, "", pos)
@@ -3,29 +3,93 @@
 
 from __future__ import annotations
 
+import glob
+import hashlib
 import logging
-from typing import Dict, Optional
+import os
+import pickle
+from time import perf_counter
+from typing import Callable, Dict, Mapping, Optional
 
 import yaml
 from fastapi import HTTPException
 from pydantic import BaseModel, ValidationError
 
+from libs.files import Files
+
 log = logging.getLogger(__name__)
 
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 class Storage():
-    def __init__(self: Storage, path: str) -> None:
+    snapshots: Optional[str] = None
+
+    def __init__(self: Storage, path: str,
+                 shared: Optional[Callable[[str], Optional[Mapping]]] = None) -> None:
         self.path = path
+        self.shared = shared
+        self.revision = 0
         self.load()
 
     def load(self: Storage) -> None:
+        start = perf_counter()
+        if self.shared is not None:
+            data = self.shared(self.path)
+            if data is not None:
+                self.swap(data, start)
+                log.info(f"Storage {self.path} mapped from the shared catalog")
+                return
         try:
-            with open(self.path, "r") as file:
-                self.data = yaml.load(file, Loader=yaml.SafeLoader)
+            with open(self.path, "rb") as file:
+                raw = file.read()
         except FileNotFoundError as not_found_err:
             raise HTTPException(status_code=404,
                                 detail=f"File {self.path} not found") \
                 from not_found_err
+        digest = hashlib.sha256(raw).hexdigest()
+        data = self.load_snapshot(digest)
+        source = "snapshot"
+        if data is None:
+            data = yaml.load(raw, Loader=Loader)
+            self.save_snapshot(digest, data)
+            source = Loader.__name__
+        self.swap(data, start)
+        log.info(f"Storage {self.path} loaded from {source} "
+                 f"in {self.duration * 1000:.1f} ms")
+
+    def swap(self: Storage, data: Optional[Mapping], start: float) -> None:
+        self.data = data
+        self.revision += 1
+        self.duration = perf_counter() - start
+
+    def snapshot(self: Storage, digest: str = "*") -> str:
+        name = os.path.normpath(self.path).replace(os.sep, "_")
+        return os.path.join(self.snapshots, f"{name}.{digest}.pickle")
+
+    def load_snapshot(self: Storage, digest: str) -> Optional[Dict]:
+        if self.snapshots is None:
+            return None
+        try:
+            with open(self.snapshot(digest), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as err:
+            log.warning(f"Snapshot of {self.path} not valid: {err}")
+            return None
+
+    def save_snapshot(self: Storage, digest: str, data: Optional[Mapping]) -> None:
+        if self.snapshots is None:
+            return
+        try:
+            os.makedirs(self.snapshots, exist_ok=True)
+            for stale in glob.glob(self.snapshot()):
+                os.unlink(stale)
+            with Files.atomic(self.snapshot(digest)) as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PicklingError) as err:
+            log.warning(f"Snapshot of {self.path} not saved: {err}")
 
     def get(self: Storage, key: str,
             default: Optional[any] = None) -> Dict:
@@ -44,3 +108,4 @@ class Storage():
 
 
 settings = Storage("config/settings.yaml")
+Storage.snapshots = settings.get("storage-snapshots", ".cache/snapshots")
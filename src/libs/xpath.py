@@ -0,0 +1,123 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, Iterator, List, Type
+
+WILDCARD = "*"
+
+
+class Missing:
+    def __repr__(self: Missing) -> str:
+        return "MISSING"
+
+    def __bool__(self: Missing) -> bool:
+        return False
+
+
+MISSING = Missing()
+
+
+class XPath:
+    class Node:
+        __slots__ = ("keys", "children")
+
+        def __init__(self: XPath.Node) -> None:
+            self.keys: List[Hashable] = []
+            self.children: Dict[str, XPath.Node] = {}
+
+        def descendants(self: XPath.Node) -> Iterator[Hashable]:
+            yield from self.keys
+            for child in self.children.values():
+                yield from child.descendants()
+
+    @classmethod
+    def compile(cls: Type[XPath],
+                xpaths: Dict[Hashable, List[str]]) -> XPath.Node:
+        root = cls.Node()
+        for key, xpath in xpaths.items():
+            node = root
+            for token in xpath:
+                child = node.children.get(token)
+                if child is None:
+                    child = node.children[token] = cls.Node()
+                node = child
+            node.keys.append(key)
+        return root
+
+    @classmethod
+    def extract(cls: Type[XPath], doc: Any,
+                trie: XPath.Node) -> Dict[Hashable, Any]:
+        res: Dict[Hashable, Any] = {}
+        cls.walk(trie, doc, res)
+        return res
+
+    @classmethod
+    def get(cls: Type[XPath], doc: Any, xpath: List[str]) -> Any:
+        return cls.extract(doc, cls.compile({None: xpath}))[None]
+
+    @classmethod
+    def set(cls: Type[XPath], doc: Any, xpath: List[str], value: Any) -> None:
+        if not xpath:
+            raise KeyError("empty xpath")
+        dest = doc
+        for token in xpath[:-1]:
+            dest = cls.step(dest, str(token))
+            if dest is MISSING:
+                raise KeyError(token)
+        token = str(xpath[-1])
+        if token == WILDCARD:
+            raise KeyError(f"{WILDCARD} not allowed in update")
+        if isinstance(dest, list):
+            dest[int(token)] = value
+        elif isinstance(dest, dict):
+            dest[cls.key(dest, token)] = value
+        else:
+            raise TypeError(f"{type(dest).__name__} not indexable by {token}")
+
+    @classmethod
+    def walk(cls: Type[XPath], node: XPath.Node, value: Any,
+             res: Dict[Hashable, Any]) -> None:
+        if value is MISSING:
+            for key in node.descendants():
+                res[key] = MISSING
+            return
+        for key in node.keys:
+            res[key] = value
+        for token, child in node.children.items():
+            if token != WILDCARD:
+                cls.walk(child, cls.step(value, token), res)
+                continue
+            parts: List[Dict[Hashable, Any]] = []
+            for item in cls.items(value):
+                part: Dict[Hashable, Any] = {}
+                cls.walk(child, item, part)
+                parts.append(part)
+            for key in child.descendants():
+                res[key] = [part[key] for part in parts
+                            if part[key] is not MISSING]
+
+    @staticmethod
+    def key(container: Dict, token: str) -> Hashable:
+        if token not in container and token.lstrip("-").isdigit() \
+           and int(token) in container:
+            return int(token)
+        return token
+
+    @classmethod
+    def step(cls: Type[XPath], value: Any, token: str) -> Any:
+        if isinstance(value, dict):
+            return value.get(cls.key(value, token), MISSING)
+        if isinstance(value, list) and token.lstrip("-").isdigit():
+            index = int(token)
+            return value[index] if -len(value) <= index < len(value) else MISSING
+        return MISSING
+
+    @staticmethod
+    def items(value: Any) -> Iterator[Any]:
+        if isinstance(value, dict):
+            return iter(value.values())
+        if isinstance(value, list):
+            return iter(value)
+        return iter(())
@@ -6,33 +6,61 @@ from functools import partial
 from fastapi import FastAPI
 
 from about import description, title, version
+from libs.catalog import Catalog
 from libs.console import header
+from libs.documents import Documents
+from libs.fanout import FanOut
+from libs.jobs import Jobs
+from libs.metrics import Metrics
+from libs.notifier import Notifier
+from libs.profiler import Profiler
 from libs.reloader import Reloader
 from libs.storage import settings
 from routers.chains import router as chains_router
 from routers.commands import router as commands_router
 from routers.configurations import router as configurations_router
+from routers.metrics import router as metrics_router
 from routers.parameters import router as parameters_router
+from routers.profiles import router as profiles_router
+from routers.watch import router as watch_router
 
 app = FastAPI(
     debug=settings.get("debug", False),
     title=title,
     version=version,
     description=description,
-    on_startup=[header, partial(Reloader.start, path="config")],
-    on_shutdown=[Reloader.stop]
+    on_startup=[header, partial(Reloader.start, path="config",
+                                catalogs=not Catalog.shared),
+                Documents.start],
+    on_shutdown=[Jobs.stop, Documents.stop, Reloader.stop, FanOut.close]
 )
 
 app.include_router(commands_router)
 app.include_router(configurations_router)
 app.include_router(parameters_router)
 app.include_router(chains_router)
+app.include_router(watch_router)
+app.include_router(metrics_router)
+app.add_middleware(Metrics.Middleware)
+if Catalog.shared:
+    app.router.on_startup.append(Catalog.start)
+    app.router.on_shutdown.append(Catalog.stop)
+    app.add_middleware(Catalog.Middleware)
+if Profiler.enabled:
+    app.include_router(profiles_router)
+    app.add_middleware(Profiler.Middleware)
 
 if __name__ == "__main__":
     import uvicorn
+    Metrics.prepare()
+    reload = settings.get('reload', True)
+    workers = settings.get('workers', 5)
+    if workers > 1 and not reload:
+        Catalog.prepare()
+        Notifier.share()
     uvicorn.run("main:app", host=settings.get('host', '0.0.0.0'),
                 port=settings.get('port', 9999),
-                reload=settings.get('reload', True),
-                workers=settings.get('workers', 5),
+                reload=reload,
+                workers=workers,
                 log_level=settings.get('log-level', 'info'),
                 log_config="config/log.yaml")
@@ -4,12 +4,14 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Dict
+from typing import Dict, List, Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Query, Request, Response
 from pydantic import BaseModel, Field
 
 from libs.base import Base
+from libs.fanout import FanOut
 
 router = APIRouter()
 
@@ -20,6 +22,13 @@ class Relationship(str, Enum):
     sibling = "sibling"
 
 
+class Resource(str, Enum):
+    chains = "chains"
+    commands = "commands"
+    configurations = "configurations"
+    parameters = "parameters"
+
+
 class Chains(Base):
     class Id(str, Enum, metaclass=Base.IdMeta):
         pass
@@ -28,12 +37,14 @@ class Chains(Base):
     storage_path: str = "config/chains.yaml"
 
     class InputModel(BaseModel):
-        uri: str = Field(example="http://localhost:8080",
-                         description="URI of the chain node",
-                         required=True)
-        relationship: Relationship = Field(example=Relationship.child,
+        uri: str = Field(..., example="http://localhost:8080",
+                         description="URI of the chain node")
+        relationship: Relationship = Field(..., example=Relationship.child,
                                            description="Relationship of "
-                                           "the chain node", required=True)
+                                           "the chain node")
+        timeout: Optional[float] = Field(example=5,
+                                         description="Timeout in seconds "
+                                         "of the requests to the chain node")
 
     class OutputModel(InputModel):
         pass
@@ -45,12 +56,48 @@ Chains.setup()
 @router.get("/chains",
             description="List all available chains settings",
             response_model=Dict[Chains.Id, Chains.OutputModel])
-def get() -> Dict[Chains.Id, Chains.OutputModel]:
-    return {chain: get_record(chain) for chain in Chains.Id}
+def get(
+    request: Request,
+    listing: Chains.Listing = Depends(Chains.list_query)
+) -> Response:
+    return Chains.stream_list(listing, Chains.get, request)
 
 
 @ router.get("/chains/{id}",
              description="Get the chain settings",
              response_model=Chains.OutputModel)
 def get_record(id: Chains.Id) -> Chains.OutputModel:
-    return Chains.get(id)
+    return Chains.respond(Chains.get(id))
+
+
+@router.get("/chains/gather/{resource}",
+            description="Get the resource from all the chain nodes",
+            response_model=Dict[Chains.Id, FanOut.ResultModel])
+async def gather(
+    resource: Resource,
+    relationship: List[Relationship] = Query([Relationship.child,
+                                              Relationship.sibling])
+) -> Dict[Chains.Id, FanOut.ResultModel]:
+    return await gather_path(f"/{resource.value}", relationship)
+
+
+@router.get("/chains/gather/{resource}/{id}",
+            description="Get the resource item from all the chain nodes",
+            response_model=Dict[Chains.Id, FanOut.ResultModel])
+async def gather_record(
+    resource: Resource, id: str,
+    relationship: List[Relationship] = Query([Relationship.child,
+                                              Relationship.sibling])
+) -> Dict[Chains.Id, FanOut.ResultModel]:
+    return await gather_path(f"/{resource.value}/{quote(id, safe='')}", relationship)
+
+
+async def gather_path(
+    path: str, relationship: List[Relationship]
+) -> Dict[Chains.Id, FanOut.ResultModel]:
+    nodes = {}
+    for chain in Chains.Id:
+        node: Chains.InputModel = Chains.get(chain)
+        if node.relationship in relationship:
+            nodes[chain] = (node.uri, node.timeout)
+    return await FanOut.gather(nodes, path)
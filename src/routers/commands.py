@@ -3,15 +3,24 @@
 
 from __future__ import annotations
 
+from datetime import datetime
 from enum import Enum
-from functools import partial
-from subprocess import PIPE, CompletedProcess, Popen, run
-from typing import Callable, Dict, Optional
+from subprocess import CompletedProcess
+from time import perf_counter
+from typing import AsyncIterator, Dict, List, Optional, Type
 
-from fastapi import APIRouter
+from fastapi import (APIRouter, Depends, HTTPException, Path, Query, Request,
+                     Response)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from libs.base import Base
+from libs.capture import Capture, Channel
+from libs.daemons import Daemons
+from libs.executor import Executor
+from libs.jobs import Jobs
+from libs.memo import Memo
+from libs.metrics import Metrics
 
 router = APIRouter()
 
@@ -29,10 +38,76 @@ class Commands(Base):
                                        description='Indicate if the command '
                                        'has to be executed as daemon',
                                        default=False)
+        depends_on: Optional[List[str]] = Field(example=["list"],
+                                                description="Commands that have "
+                                                "to succeed before this one",
+                                                default=[])
+        pipelines: Optional[List[str]] = Field(example=["provisioning"],
+                                               description="Pipelines "
+                                               "including the command",
+                                               default=[])
+        idempotent: Optional[bool] = Field(example=True,
+                                           description="Indicate if the "
+                                           "concurrent executions can share "
+                                           "the same run", default=False)
+        cache_ttl: Optional[float] = Field(example=10, ge=0,
+                                           description="Seconds the result of "
+                                           "an idempotent command is reused",
+                                           default=0)
+        concurrency: Optional[int] = Field(example=1, ge=1,
+                                           description="Maximum number of jobs "
+                                           "of the command running at the same time",
+                                           default=None)
 
     class OutputModel(InputModel):
         pass
 
+    class NodeModel(Base.ActionModel):
+        returncode: Optional[int]
+        start: Optional[datetime]
+        end: Optional[datetime]
+        skipped: bool = False
+        wait: Optional[float]
+        duration: Optional[float]
+
+    @classmethod
+    def graph(cls: Type[Commands],
+              pipeline: Optional[str] = None) -> Dict[str, List[str]]:
+        if pipeline is None:
+            pending = [id.value for id in cls.Id]
+        else:
+            pending = [id.value for id in cls.Id
+                       if pipeline in cls.get(id).pipelines]
+            if not pending:
+                raise HTTPException(status_code=404,
+                                    detail=f"Pipeline {pipeline} not found")
+        graph: Dict[str, List[str]] = {}
+        while pending:
+            id = pending.pop()
+            if id in graph:
+                continue
+            graph[id] = cls.get(cls.Id(id)).depends_on
+            for dep in graph[id]:
+                if dep not in cls.Id:
+                    raise HTTPException(status_code=400,
+                                        detail=f"Command {id} depends on "
+                                        f"unknown command {dep}")
+                pending.append(dep)
+        cyclic = Executor.cyclic(graph)
+        if cyclic:
+            raise HTTPException(status_code=400,
+                                detail=f"Commands {cyclic} have cyclic dependencies")
+        return {id.value: graph[id.value] for id in cls.Id if id.value in graph}
+
+    @classmethod
+    def node(cls: Type[Commands], action: Optional[Base.ActionModel],
+             start: datetime) -> Commands.NodeModel:
+        if action is None:
+            return cls.NodeModel(error=True, stdout=[], stderr=[], skipped=True)
+        return cls.NodeModel(**action.dict(),
+                             wait=(action.start - start).total_seconds(),
+                             duration=(action.end - action.start).total_seconds())
+
 
 Commands.setup()
 
@@ -40,33 +115,141 @@ Commands.setup()
 @router.get("/commands",
             description="List all available command settings",
             response_model=Dict[Commands.Id, Commands.OutputModel])
-def get() -> Dict[Commands.Id, Commands.OutputModel]:
-    return {command: get_record(command) for command in Commands.Id}
+def get(
+    request: Request,
+    listing: Commands.Listing = Depends(Commands.list_query)
+) -> Response:
+    return Commands.stream_list(listing, record, request)
 
 
 @router.get("/commands/{id}",
             description="Get the command settings",
             response_model=Commands.OutputModel)
 def get_record(id: Commands.Id) -> Commands.OutputModel:
+    return Commands.respond(record(id))
+
+
+def record(id: Commands.Id) -> Commands.OutputModel:
     cmd: Commands.InputModel = Commands.get(id)
-    return Commands.OutputModel(**cmd.dict())
+    return Commands.OutputModel.construct(**cmd.dict())
 
 
 @router.post("/commands",
-             description="Execute a set of commands",
-             response_model=Dict[Commands.Id, Commands.OutputModel])
-def set() -> Dict[Commands.Id, Commands.ActionModel]:
-    return {command: set_record(command) for command in Commands.Id}
+             description="Execute a set of commands after their dependencies",
+             response_model=Dict[Commands.Id, Commands.NodeModel])
+async def set(
+    pipeline: Optional[str] = Query(None, description="Pipeline to execute, "
+                                    "if not set execute all the commands")
+) -> Dict[Commands.Id, Commands.NodeModel]:
+    graph = Commands.graph(pipeline)
+    start = datetime.now()
+
+    async def __set(id: str) -> Commands.ActionModel:
+        return await set_record(Commands.Id(id))
+
+    def __error(id: str, err: Exception) -> Commands.ActionModel:
+        now = datetime.now()
+        return Commands.ActionModel(error=True, stdout=[],
+                                    stderr=[str(getattr(err, "detail", err))],
+                                    returncode=1, start=now, end=now)
+    res = await Executor.dag(graph, __set, lambda action: action.error, __error)
+    return {Commands.Id(id): Commands.node(res.get(id), start) for id in graph}
 
 
 @router.post("/commands/{id}",
              description="Execute a command",
              response_model=Commands.ActionModel)
-def set_record(id: Commands.Id) -> Commands.ActionModel:
-    def __set(command: Commands.InputModel) -> CompletedProcess[str] | Popen:
-        fn: Callable = Popen if command.daemon else run
-        call_fn: Callable = partial(fn, shell=True, stdout=PIPE, stderr=PIPE)
-        add_args = dict(start_new_session=True) if command.daemon \
-            else dict(universal_newlines=True)
-        return call_fn(**add_args)
-    return Commands.action(id, __set)
+async def set_record(id: Commands.Id) -> Commands.ActionModel:
+    async def __set(command: Commands.InputModel) -> CompletedProcess[str]:
+        if command.daemon:
+            daemon = await Daemons.start(id.value, command.script)
+            return CompletedProcess(command.script, returncode=0,
+                                    stdout=f"Daemon started with pid {daemon.proc.pid}",
+                                    stderr="")
+        return await Executor.run(command.script)
+
+    async def __run() -> Commands.ActionModel:
+        async with Executor.slot():
+            return await Commands.async_action(id, __set)
+    command: Commands.InputModel = Commands.get(id)
+    if command.daemon or not command.idempotent:
+        return await __run()
+    return await Memo.get((id.value, command.script), command.cache_ttl, __run,
+                          lambda action: not action.error)
+
+
+@router.get("/commands/outputs/{output}/{channel}",
+            description="Get the full output of a command execution",
+            response_class=StreamingResponse)
+async def get_output(
+    channel: Channel,
+    output: str = Path(..., regex="^[0-9a-f]{32}$",
+                       description="Output id of the execution")
+) -> StreamingResponse:
+    return StreamingResponse(Capture.read(output, channel), media_type="text/plain")
+
+
+@router.post("/commands/{id}/jobs",
+             description="Submit the execution of a command as a job",
+             response_model=Jobs.JobModel, status_code=202)
+async def set_job(
+    id: Commands.Id, response: Response,
+    priority: int = Query(0, description="Priority of the job, "
+                          "the jobs with higher priority are executed first")
+) -> Jobs.JobModel:
+    command: Commands.InputModel = Commands.get(id)
+    job = Jobs.submit(id.value, priority, command.concurrency,
+                      lambda: set_record(id))
+    response.headers["Location"] = f"/commands/jobs/{job.id}"
+    return job
+
+
+@router.get("/commands/jobs/{job}",
+            description="Get the status and the result of a job",
+            response_model=Jobs.JobModel)
+async def get_job(
+    job: str = Path(..., regex="^[0-9a-f]{32}$", description="Id of the job")
+) -> Response:
+    return Response(Jobs.read(job), media_type="application/json")
+
+
+@router.post("/commands/{id}/stream",
+             description="Execute a command streaming its output "
+             "as Server-Sent Events",
+             response_class=StreamingResponse)
+async def set_record_stream(id: Commands.Id) -> StreamingResponse:
+    command: Commands.InputModel = Commands.get(id)
+
+    async def __events() -> AsyncIterator[str]:
+        start = perf_counter()
+        async for channel, line in Executor.stream(command.script):
+            if channel == "exit":
+                Metrics.action(Commands.label, id.value, "stream", int(line),
+                               perf_counter() - start)
+            yield Commands.event(channel, line)
+    return StreamingResponse(__events(), media_type="text/event-stream")
+
+
+@router.get("/commands/{id}/daemon",
+            description="Get the status of the command executed as daemon",
+            response_model=Daemons.StatusModel)
+async def get_daemon(id: Commands.Id) -> Daemons.StatusModel:
+    return Daemons.status(id.value)
+
+
+@router.get("/commands/{id}/daemon/output",
+            description="Get the last output lines of the command executed as daemon",
+            response_model=Daemons.TailModel)
+async def get_daemon_output(
+    id: Commands.Id,
+    lines: Optional[int] = Query(None, gt=0, description="Number of lines to return")
+) -> Daemons.TailModel:
+    return Daemons.output(id.value, lines)
+
+
+@router.post("/commands/{id}/daemon/stop",
+             description="Stop the command executed as daemon",
+             response_model=Daemons.StatusModel)
+async def stop_daemon(id: Commands.Id) -> Daemons.StatusModel:
+    await Daemons.stop(id.value)
+    return Daemons.status(id.value)
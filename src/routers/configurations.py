@@ -5,15 +5,21 @@ from __future__ import annotations
 
 import json
 from enum import Enum
-from functools import partial
+from itertools import chain
 from subprocess import CompletedProcess
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set
 
-import yaml
-from fastapi import APIRouter, HTTPException
+from fastapi import (APIRouter, Body, Depends, Header, HTTPException, Request,
+                     Response)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from libs.base import Base, Format
+from libs.conditional import Conditional
+from libs.documents import Documents
+from libs.patch import JSON_PATCH, MERGE_PATCH, Patch
+from libs.scanner import Scanner
 
 router = APIRouter()
 
@@ -24,25 +30,19 @@ class Configurations(Base):
 
     label: str = "configuration"
     storage_path: str = "config/configurations.yaml"
-    loader: Dict[Format, Callable] = {Format.yaml:
-                                      partial(yaml.load,
-                                              Loader=yaml.SafeLoader),
-                                      Format.json: json.load}
-    dumper: Dict[Format, Callable] = {Format.yaml: yaml.dump,
-                                      Format.json: json.dump}
+    target: str = "path"
+    loader: Dict[Format, Callable] = Documents.loader
+    dumper: Dict[Format, Callable] = Documents.dumper
 
     class InputModel(BaseModel):
-        path: str = Field(example="tests/test.json",
-                          description="Path of the configuration file",
-                          required=True)
-        format: Format = Field(example=Format.json,
-                               description="Format of the configuration file",
-                               required=True)
+        path: str = Field(..., example="tests/test.json",
+                          description="Path of the configuration file")
+        format: Format = Field(..., example=Format.json,
+                               description="Format of the configuration file")
 
     class OutputModel(InputModel):
-        content: Any = Field(example="c: 1",
-                             description="Content of the configuration file",
-                             required=True)
+        content: Any = Field(..., example="c: 1",
+                             description="Content of the configuration file")
 
 
 Configurations.setup()
@@ -51,17 +51,37 @@ Configurations.setup()
 @router.get("/configurations",
             description="List all available configuration settings",
             response_model=Dict[Configurations.Id, Configurations.OutputModel])
-def get() -> Dict[Configurations.Id, Configurations.OutputModel]:
-    return {cfg: get_record(cfg) for cfg in Configurations.Id}
+def get(
+    request: Request,
+    listing: Configurations.Listing = Depends(Configurations.list_query)
+) -> Response:
+    def __record(id: Configurations.Id) -> BaseModel | Iterable[bytes]:
+        cfg: Configurations.InputModel = Configurations.get(id)
+        if listing.fields and "content" not in listing.fields:
+            return cfg
+        if streamable(cfg):
+            return stream(cfg, listing.fields)
+        return output(cfg)
+    return Configurations.stream_list(listing, __record, request, Configurations.paths)
 
 
 @router.get("/configurations/{id}",
             description="Get the configuration settings",
             response_model=Configurations.OutputModel)
-def get_record(id: Configurations.Id) -> Configurations.OutputModel:
+def get_record(id: Configurations.Id, request: Request = None,
+               response: Response = None) -> Configurations.OutputModel:
     cfg: Configurations.InputModel = Configurations.get(id)
-    content = read(cfg)
-    return Configurations.OutputModel(**cfg.dict(), content=content)
+    not_modified = Conditional.check(request, response, Configurations.paths(id))
+    if not_modified is not None:
+        return not_modified
+    if streamable(cfg):
+        return StreamingResponse(stream(cfg), media_type="application/json",
+                                 headers=Conditional.validators(Configurations.paths(id)))
+    return Configurations.respond(output(cfg), response)
+
+
+def output(cfg: Configurations.InputModel) -> Configurations.OutputModel:
+    return Configurations.OutputModel.construct(**cfg.dict(), content=read(cfg))
 
 
 @router.post("/configurations",
@@ -88,21 +108,76 @@ def set_record(
     return Configurations.action(id, __set, content=content)
 
 
+@router.patch("/configurations/{id}",
+              description="Partially update a configuration with a JSON Merge "
+              "Patch (RFC 7386) or a JSON Patch (RFC 6902)",
+              response_model=Configurations.ActionModel)
+def patch_record(
+    id: Configurations.Id, response: Response, patch: Any = Body(...),
+    content_type: str = Header(MERGE_PATCH),
+    if_match: Optional[str] = Header(None)
+) -> Configurations.ActionModel:
+    media_type = content_type.split(";")[0].strip()
+    if media_type not in (MERGE_PATCH, JSON_PATCH):
+        raise HTTPException(status_code=415,
+                            detail=f"Content type {media_type} not supported, "
+                            f"use {MERGE_PATCH} or {JSON_PATCH}")
+
+    def __set(cfg: Configurations.InputModel) -> CompletedProcess[str]:
+        try:
+            with Documents.guard(cfg.path):
+                if if_match is not None and \
+                   not Conditional.match(Conditional.etag(Configurations.paths(id)), if_match):
+                    raise HTTPException(status_code=412,
+                                        detail=f"File {cfg.path} changed")
+                content = Documents.current(cfg.path, cfg.format)
+                if media_type == MERGE_PATCH:
+                    content = Patch.merge(content, patch)
+                else:
+                    content = Patch.apply(content, patch)
+                Documents.dump(cfg.path, cfg.format, content)
+                response.headers["ETag"] = Conditional.etag(Configurations.paths(id))
+        except FileNotFoundError as not_found_err:
+            raise HTTPException(status_code=404,
+                                detail=f"File {cfg.path} not found") from not_found_err
+        return CompletedProcess([], returncode=0, stdout="", stderr="")
+
+    return Configurations.action(id, __set)
+
+
 def read(cfg: Configurations.InputModel) -> any:
     try:
-        with open(cfg.path, "r") as file:
-            loader: Callable = Configurations.loader[cfg.format]
-            return loader(file)
+        return Documents.load(cfg.path, cfg.format)
+    except FileNotFoundError as not_found_err:
+        raise HTTPException(status_code=404,
+                            detail=f"File {cfg.path} not found") from not_found_err
+
+
+def streamable(cfg: Configurations.InputModel) -> bool:
+    try:
+        return Documents.streamable(cfg.path, cfg.format)
+    except FileNotFoundError as not_found_err:
+        raise HTTPException(status_code=404,
+                            detail=f"File {cfg.path} not found") from not_found_err
+
+
+def stream(cfg: Configurations.InputModel,
+           fields: Optional[Set[str]] = None) -> Iterator[bytes]:
+    try:
+        chunks = Scanner.chunks(cfg.path)
     except FileNotFoundError as not_found_err:
         raise HTTPException(status_code=404,
                             detail=f"File {cfg.path} not found") from not_found_err
+    head = "".join(f"{json.dumps(key)}:{json.dumps(value)},"
+                   for key, value in jsonable_encoder(cfg).items()
+                   if not fields or key in fields)
+    return chain([f'{{{head}"content":'.encode()], chunks, [b"}"])
 
 
 def write(cfg: Configurations.InputModel, content: Any) -> None:
     try:
-        with open(cfg.path, "w") as file:
-            dumper: Callable = Configurations.dumper[cfg.format]
-            dumper(content, file)
+        with Documents.guard(cfg.path):
+            Documents.dump(cfg.path, cfg.format, content)
     except FileNotFoundError as not_found_err:
         raise HTTPException(status_code=404,
                             detail=f"File {cfg.path} not found") from not_found_err
@@ -0,0 +1,16 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from fastapi import APIRouter, Response
+
+from libs.metrics import Metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics",
+            description="Metrics in the Prometheus text format",
+            response_class=Response)
+def get() -> Response:
+    return Response(Metrics.generate(),
+                    headers={"Content-Type": Metrics.content_type})
@@ -3,17 +3,19 @@
 
 from __future__ import annotations
 
-import json
+from datetime import datetime
 from enum import Enum
-from functools import partial
 from subprocess import CompletedProcess
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
-import yaml
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 
 from libs.base import Base, Format
+from libs.conditional import Conditional
+from libs.documents import Documents
+from libs.scanner import Scanner
+from libs.xpath import MISSING, XPath
 
 router = APIRouter()
 
@@ -24,12 +26,9 @@ class Parameters(Base):
 
     label: str = "parameter"
     storage_path: str = "config/parameters.yaml"
-    loader: Dict[Format, Callable] = {Format.yaml:
-                                      partial(yaml.load,
-                                              Loader=yaml.SafeLoader),
-                                      Format.json: json.load}
-    dumper: Dict[Format, Callable] = {Format.yaml: yaml.dump,
-                                      Format.json: json.dump}
+    target: str = "source"
+    loader: Dict[Format, Callable] = Documents.loader
+    dumper: Dict[Format, Callable] = Documents.dumper
 
     class InputModel(BaseModel):
         source: str
@@ -47,25 +46,56 @@ Parameters.setup()
 @router.get("/parameters",
             description="List all available parameter settings",
             response_model=Dict[Parameters.Id, Parameters.OutputModel])
-def get() -> Dict[Parameters.Id, Parameters.OutputModel]:
-    return {param: get_record(param) for param in Parameters.Id}
+def get(
+    request: Request,
+    listing: Parameters.Listing = Depends(Parameters.list_query)
+) -> Response:
+    values: Dict[Parameters.Id, Tuple[Parameters.InputModel, Any]] = {}
+    projection = listing.fields and not listing.fields & {"value", "not_found"}
+
+    def __prepare(ids: List[Parameters.Id]) -> None:
+        if not projection:
+            values.update(extract(ids))
+
+    def __record(id: Parameters.Id) -> BaseModel:
+        if projection:
+            return Parameters.get(id)
+        if id in values:
+            return output(*values[id])
+        return record(id)
+    return Parameters.stream_list(listing, __record, request, Parameters.paths, __prepare)
 
 
 @router.get("/parameters/{id}",
             description="Get the parameter settings",
             response_model=Parameters.OutputModel)
-def get_record(id: Parameters.Id) -> Parameters.OutputModel:
+def get_record(id: Parameters.Id, request: Request = None,
+               response: Response = None) -> Parameters.OutputModel:
     param: Parameters.InputModel = Parameters.get(id)
-    value = read(param)
-    return Parameters.OutputModel(**param.dict(), value=value, not_found=value is None)
+    not_modified = Conditional.check(request, response, Parameters.paths(id))
+    if not_modified is not None:
+        return not_modified
+    return Parameters.respond(output(param, read(param)), response)
+
+
+def record(id: Parameters.Id) -> Parameters.OutputModel:
+    param: Parameters.InputModel = Parameters.get(id)
+    return output(param, read(param))
 
 
 @router.post("/parameters",
              description="Update a set of parameters",
-             response_model=Dict[Parameters.Id, Parameters.OutputModel])
+             response_model=Dict[Parameters.Id, Parameters.ActionModel])
 def set(data: Dict[Parameters.Id, Any]) -> Dict[Parameters.Id,
                                                 Parameters.ActionModel]:
-    return {id: set_record(id, value) for id, value in data.items()}
+    groups: Dict[Tuple[str, Format], Dict[Parameters.Id, Any]] = {}
+    for id, value in data.items():
+        param: Parameters.InputModel = Parameters.get(id)
+        groups.setdefault((param.source, param.format), {})[id] = value
+    res: Dict[Parameters.Id, Parameters.ActionModel] = {}
+    for (source, format), values in groups.items():
+        res.update(write_group(source, format, values))
+    return res
 
 
 @router.post("/parameters/{id}",
@@ -87,34 +117,84 @@ def set_record_inline(id: Parameters.Id, value: Any) -> Parameters.ActionModel:
     return Parameters.action(id, __set, value=value)
 
 
+def output(param: Parameters.InputModel, value: Any) -> Parameters.OutputModel:
+    not_found = value is MISSING
+    return Parameters.OutputModel.construct(**param.dict(),
+                                            value=None if not_found else value,
+                                            not_found=not_found)
+
+
 def read(param: Parameters.InputModel) -> any:
     try:
-        with open(param.source, "r") as file:
-            loader: Callable = Parameters.loader[param.format]
-            content = loader(file)
-            value = content
-            for x in param.xpath:
-                value = value.get(x, {})
-            if value == {}:
-                value = None
-            return value
+        if Documents.streamable(param.source, param.format):
+            return Scanner.get(param.source, param.xpath)
+        return XPath.get(Documents.load(param.source, param.format), param.xpath)
     except FileNotFoundError as not_found_err:
         raise HTTPException(status_code=404,
                             detail=f"File {param.source} not found") from not_found_err
 
 
+def extract(
+    ids: Iterable[Parameters.Id]
+) -> Dict[Parameters.Id, Tuple[Parameters.InputModel, Any]]:
+    groups: Dict[Tuple[str, Format], Dict[Parameters.Id, Parameters.InputModel]] = {}
+    for id in ids:
+        try:
+            param: Parameters.InputModel = Parameters.get(id)
+        except HTTPException:
+            continue
+        groups.setdefault((param.source, param.format), {})[id] = param
+    res: Dict[Parameters.Id, Tuple[Parameters.InputModel, Any]] = {}
+    for (source, format), params in groups.items():
+        trie = XPath.compile({id: param.xpath for id, param in params.items()})
+        try:
+            if Documents.streamable(source, format):
+                values = Scanner.extract(source, trie)
+            else:
+                values = XPath.extract(Documents.load(source, format), trie)
+        except FileNotFoundError:
+            continue
+        for id, value in values.items():
+            res[id] = (params[id], value)
+    return res
+
+
 def write(param: Parameters.InputModel, value: any) -> None:
+    def __update(content: any) -> None:
+        update(content, param, value)
+
     try:
-        with open(param.source, "r") as file:
-            loader: Callable = Parameters.loader[param.format]
-            content = loader(file)
-            dest = content
-            for x in param.xpath[:-1]:
-                dest = dest[x]
-            dest[param.xpath[-1]] = value
-        with open(param.source, "w") as file:
-            dumper: Callable = Parameters.dumper[param.format]
-            dumper(content, file)
+        Documents.update(param.source, param.format, __update)
     except FileNotFoundError as not_found_err:
         raise HTTPException(status_code=404,
                             detail=f"File {param.source} not found") from not_found_err
+
+
+def write_group(
+    source: str, format: Format, values: Dict[Parameters.Id, Any]
+) -> Dict[Parameters.Id, Parameters.ActionModel]:
+    def __set(parameter: Parameters.InputModel, content: any,
+              value: Any) -> CompletedProcess[str]:
+        try:
+            update(content, parameter, value)
+            return CompletedProcess([], returncode=0, stdout="", stderr="")
+        except (KeyError, IndexError, TypeError, ValueError) as err:
+            return CompletedProcess([], returncode=1, stdout="",
+                                    stderr=f"Xpath {parameter.xpath} not valid: {err}")
+
+    def __update(content: any) -> Dict[Parameters.Id, Parameters.ActionModel]:
+        return {id: Parameters.action(id, __set, content=content, value=value)
+                for id, value in values.items()}
+
+    try:
+        res = Documents.update(source, format, __update,
+                               lambda res: any(not action.error for action in res.values()))
+    except FileNotFoundError as not_found_err:
+        raise HTTPException(status_code=404,
+                            detail=f"File {source} not found") from not_found_err
+    end = datetime.now()
+    return {id: action.copy(update=dict(end=end)) for id, action in res.items()}
+
+
+def update(content: any, param: Parameters.InputModel, value: any) -> None:
+    XPath.set(content, param.xpath, value)
@@ -0,0 +1,25 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from typing import List
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from libs.profiler import Profiler
+
+router = APIRouter()
+
+
+@router.get("/profiles",
+            description="Ids of the saved profiles, from the oldest",
+            response_model=List[str])
+def get() -> List[str]:
+    return Profiler.list()
+
+
+@router.get("/profiles/{id}",
+            description="Saved profile as collapsed stacks",
+            response_class=PlainTextResponse)
+def get_record(id: str) -> PlainTextResponse:
+    return PlainTextResponse(Profiler.load(id))
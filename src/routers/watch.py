@@ -0,0 +1,64 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+from __future__ import annotations
+
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+
+from libs.base import Base
+from libs.notifier import Notifier
+from libs.storage import settings
+
+router = APIRouter()
+
+timeout: float = settings.get("watch-timeout", 30)
+keepalive: float = settings.get("watch-keepalive", 15)
+
+
+@router.get("/watch",
+            description="Wait for the changes after the revision (long-poll)",
+            response_model=Notifier.WatchModel)
+async def get(
+    revision: Optional[int] = Query(None, ge=0, description="Last revision "
+                                    "received, if not set return immediately "
+                                    "the current one"),
+    resource: Optional[List[str]] = Query(None, description="Resources "
+                                          "to watch"),
+    wait: float = Query(timeout, ge=0, le=timeout, description="Maximum "
+                        "seconds to wait for a change")
+) -> Notifier.WatchModel:
+    if revision is None:
+        return Notifier.since(Notifier.current())
+    return await Notifier.wait(revision, resource, wait)
+
+
+@router.get("/watch/stream",
+            description="Stream the changes as Server-Sent Events",
+            response_class=StreamingResponse)
+async def stream(
+    revision: Optional[int] = Query(None, ge=0, description="Last revision "
+                                    "received, if not set stream only the "
+                                    "next changes"),
+    resource: Optional[List[str]] = Query(None, description="Resources "
+                                          "to watch"),
+    last_event_id: Optional[str] = Header(None)
+) -> StreamingResponse:
+    if last_event_id is not None and last_event_id.isdigit():
+        revision = int(last_event_id)
+    last = Notifier.current() if revision is None else revision
+
+    async def __events() -> AsyncIterator[str]:
+        nonlocal last
+        while True:
+            res = await Notifier.wait(last, resource, keepalive)
+            if res.reset:
+                yield Base.event("reset", str(res.revision), id=res.revision)
+            for event in res.events:
+                yield Base.event("change", event.json(), id=event.revision)
+            if not res.reset and not res.events:
+                yield ": keepalive\n\n"
+            last = res.revision
+    return StreamingResponse(__events(), media_type="text/event-stream")
@@ -0,0 +1,54 @@
+# Copyright (c) 2022-2029 S2N National Lab @ CNIT (https://github.com/s2n-cnit/scms)
+# author: Alex Carrega <alessandro.carrega@unige.it>
+
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from libs.scanner import Scanner  # noqa: E402
+from libs.xpath import XPath  # noqa: E402
+
+SCALARS = [0, 1, -2.5, 1e10, True, False, None, "", "s", "a,b]}", 'q"x', "[{"]
+KEYS = ["a", "b", "c0", "0", "1", "*x"]
+TOKENS = ["a", "b", "c0", "0", "1", "2", "-1", "*"]
+
+
+def document(rnd, depth=0):
+    kind = rnd.random()
+    if depth > 7 or kind < 0.3:
+        return rnd.choice(SCALARS)
+    if kind < 0.65:
+        return [document(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    return {rnd.choice(KEYS): document(rnd, depth + 1)
+            for _ in range(rnd.randint(0, 4))}
+
+
+def check(tmp_path, doc, xpaths, indent=None):
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps(doc, indent=indent))
+    trie = XPath.compile(xpaths)
+    assert Scanner.extract(str(path), trie) == XPath.extract(doc, trie)
+
+
+@pytest.mark.parametrize("doc, xpath", [
+    ({"a": [True, {"a": {"b": [{"b": {}}]}}]}, ["b"]),
+    ([[[[[[], [{"c0": []}]]]], 1, 1], -2.5], ["0", "2"]),
+    ({"a": 5}, ["a", "*"]),
+    ([1, [2, {"a": 3}]], ["*", "*"]),
+    ({"a": [[[[[[[[1]]]]]]]], "b": 2}, ["b"]),
+])
+def test_cases(tmp_path, doc, xpath):
+    check(tmp_path, doc, {None: xpath})
+
+
+def test_random(tmp_path):
+    rnd = random.Random(0)
+    for _ in range(3000):
+        xpaths = {n: [rnd.choice(TOKENS) for _ in range(rnd.randint(0, 4))]
+                  for n in range(rnd.randint(1, 3))}
+        check(tmp_path, document(rnd), xpaths, rnd.choice([None, 0, 2]))